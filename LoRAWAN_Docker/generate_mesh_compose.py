@@ -1,5 +1,6 @@
 import yaml
 import random
+import os
 
 num_nodes = 120
 base_port = 5000
@@ -7,49 +8,69 @@ max_neighbors = 3
 cpu_limit = "0.05"  # 5% of a CPU
 mem_limit = "20m"  # 20MB RAM
 
-compose = {
-    "services": {},
-    "networks": {
-        "meshnet": {
-            "driver": "bridge"
-        }
-    }
-}
-
-for i in range(1, num_nodes + 1):
-    node_name = f"node{i}"
-    listen_port = base_port + i
-
-    next_nodes = random.sample(
-        [f"node{j}:{base_port + j}" for j in range(1, num_nodes + 1) if j != i],
-        k=min(max_neighbors, num_nodes - 1)
-    )
-
-    compose["services"][node_name] = {
-        "build": ".",
-        "container_name": node_name,
-        "environment": [
-            f"NODE_NAME={node_name}",
-            f"LISTEN_PORT={listen_port}",
-            f"NEXT_NODES={','.join(next_nodes)}",
-            f"START_NODE={'true' if i == 1 else 'false'}"
-        ],
+
+def mesh_topology(num_nodes, max_neighbors, subnet_count, rng, base_port=5000):
+    """[(name, port, networks, next_nodes, start_node)] for one network: every node forwards to
+    max_neighbors random others, and node1 sends readings.
+
+    sweep.py, flood_model.py and simulate_mesh.py build their topologies here too.
+    """
+    if subnet_count != 1:
+        raise ValueError(f"this version runs on one network; subnet_count must be 1, not {subnet_count}")
+    topology = []
+    for i in range(1, num_nodes + 1):
+        # the same draws as sampling the list of the other nodes, without building it
+        others = rng.sample(range(1, num_nodes), k=min(max_neighbors, num_nodes - 1))
+        next_nodes = [f"node{j if j < i else j + 1}:{base_port + (j if j < i else j + 1)}" for j in others]
+        topology.append((f"node{i}", base_port + i, ["meshnet"], next_nodes, i == 1))
+    return topology
+
+
+if __name__ == "__main__":
+    seed = int(os.getenv("SEED") or random.randrange(2 ** 32))  # SEED=<n> regenerates the same topology
+    rng = random.Random(seed)
+
+    compose = {
+        "services": {},
         "networks": {
             "meshnet": {
-                "aliases": [node_name]
+                "driver": "bridge"
             }
-        },
-        "deploy": {
-            "resources": {
-                "limits": {
-                    "cpus": cpu_limit,
-                    "memory": mem_limit
+        }
+    }
+
+    for node_name, listen_port, networks, next_nodes, start_node in mesh_topology(num_nodes, max_neighbors, 1, rng, base_port):
+        compose["services"][node_name] = {
+            "build": ".",
+            "container_name": node_name,
+            "environment": [
+                f"NODE_NAME={node_name}",
+                f"LISTEN_PORT={listen_port}",
+                f"NEXT_NODES={','.join(next_nodes)}",
+                f"START_NODE={'true' if start_node else 'false'}",
+                f"SEED={seed}"  # nodes seed their own random decisions from it
+            ],
+            "networks": {
+                network: {
+                    "aliases": [node_name]
+                } for network in networks
+            },
+            "deploy": {
+                "resources": {
+                    "limits": {
+                        "cpus": cpu_limit,
+                        "memory": mem_limit
+                    }
                 }
             }
         }
-    }
 
-with open("docker-compose.yml", "w") as f:
-    yaml.dump(compose, f, default_flow_style=False)
+    with open("docker-compose.yml", "w") as f:
+        yaml.dump(compose, f, default_flow_style=False)
+
+    # The same topology for host mode (HOST_NODES=host_nodes.txt python node.py), one node per line
+    with open("host_nodes.txt", "w") as f:
+        for service in compose["services"].values():
+            f.write(" ".join(service["environment"]) + "\n")
 
-print(f"✅ docker-compose.yml for {num_nodes} nodes generated with resource constraints.")
+    print(f"✅ docker-compose.yml for {num_nodes} nodes generated with resource constraints (seed {seed}).")
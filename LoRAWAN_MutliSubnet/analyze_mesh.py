@@ -244,6 +244,7 @@ energy_data.columns = ["node", "received"]
 energy_data["sent"] = df["from"].value_counts()
 energy_data = energy_data.fillna(0)
 energy_data["energy"] = energy_data["sent"] * 1 + energy_data["received"] * 0.5
+energy_per_delivery = energy_data["energy"].sum() / df.drop_duplicates(subset=["msg_id", "node"]).shape[0]
 energy_data.to_csv(data_dir / "node_energy.csv", index=False)
 plt.figure(figsize=(12, 6))
 sns.barplot(x="node", y="energy", data=energy_data.sort_values("energy", ascending=False).head(20))
@@ -349,6 +350,23 @@ def generate_mesh_topology():
 
 generate_mesh_topology()
 
+# ----------------------------
+# Link-layer counters (stats.json per node, when collected)
+# ----------------------------
+link_stats, airtime_stats = [], []
+for file in log_dir.glob("*_stats.json"):
+    try:
+        node_stats = json.loads(file.read_text())
+    except (OSError, ValueError):
+        continue
+    link_stats.append(node_stats.get("link", {}))
+    airtime_stats.append(node_stats.get("airtime", {}))
+link_totals = {key: sum(s.get(key, 0) for s in link_stats)
+               for key in ("tx_datagrams", "tx_bytes", "retransmits", "acks_sent", "acked", "gave_up")}
+airtime_totals = {key: sum(s.get(key, 0) for s in airtime_stats)
+                  for key in ("airtime_s", "deferred", "dropped", "wait_s")}
+deliveries = df.drop_duplicates(subset=["msg_id", "node"]).shape[0]
+
 # ----------------------------
 # 7. Save Comprehensive Metrics
 # ----------------------------
@@ -396,7 +414,8 @@ with open(data_dir / "mesh_metrics.txt", "w") as f:
     f.write("7. Energy Metrics\n")
     f.write("-" * 20 + "\n")
     f.write(f"Top Energy Node: {top_energy_node} with {top_energy_val} units\n")
-    f.write(f"Avg Energy Used per Node: {avg_energy} units\n\n")
+    f.write(f"Avg Energy Used per Node: {avg_energy} units\n")
+    f.write(f"Energy per Delivered Message: {energy_per_delivery:.2f} units\n\n")
 
     f.write("8. Spread Efficiency\n")
     f.write("-" * 20 + "\n")
@@ -406,6 +425,15 @@ with open(data_dir / "mesh_metrics.txt", "w") as f:
     f.write("-" * 20 + "\n")
     f.write(f"Jain's Fairness Index on Node Load: {fairness}\n\n")
 
+    if link_stats:
+        f.write("10. Link Layer\n")
+        f.write("-" * 20 + "\n")
+        f.write(f"Datagrams Sent: {link_totals['tx_datagrams']} ({link_totals['tx_bytes']} bytes)\n")
+        f.write(f"Retransmissions: {link_totals['retransmits']}, ACKs Sent: {link_totals['acks_sent']}, Given Up: {link_totals['gave_up']}\n")
+        f.write(f"Datagrams per Delivery: {link_totals['tx_datagrams'] / deliveries:.2f}\n")
+        f.write(f"Time on Air: {airtime_totals['airtime_s']:.2f} s ({airtime_totals['airtime_s'] / deliveries:.3f} s per delivery)\n")
+        f.write(f"Duty Cycle: {airtime_totals['deferred']} deferred ({airtime_totals['wait_s']:.2f} s waiting), {airtime_totals['dropped']} dropped\n\n")
+
 print("\nAnalysis complete! All outputs saved in 'mesh_analysis' directory:")
 print(f"  - Plots: {plots_dir}")
 print(f"  - Data: {data_dir}")
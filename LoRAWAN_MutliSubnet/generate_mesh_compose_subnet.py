@@ -1,6 +1,8 @@
 import yaml
 import random
+import os
 import math
+import bisect
 from itertools import combinations
 
 # Configuration
@@ -10,105 +12,98 @@ max_neighbors = 3
 cpu_limit = "0.05"  # 5% CPU
 mem_limit = "20m"   # 20MB memory
 subnet_count = 4
-nodes_per_subnet = math.ceil(num_nodes / subnet_count)
-subnet_names = [f"meshnet{i+1}" for i in range(subnet_count)]
-
-# Initialize docker-compose structure
-compose = {
-    "services": {},
-    "networks": {subnet: {"driver": "bridge"} for subnet in subnet_names}
-}
-
-# Create regular node services
-for i in range(1, num_nodes + 1):
-    node_name = f"node{i}"
-    listen_port = base_port + i
-    subnet_idx = min((i - 1) // nodes_per_subnet, subnet_count - 1)
-    subnet = subnet_names[subnet_idx]
-
-    # We'll fill NEXT_NODES after all services are created and bridge nodes are set
-    compose["services"][node_name] = {
-        "build": ".",
-        "container_name": node_name,
-        "environment": [
-            f"NODE_NAME={node_name}",
-            f"LISTEN_PORT={listen_port}",
-            f"NEXT_NODES=PLACEHOLDER",  # Will fill after bridge logic
-            f"START_NODE={'true' if i == 1 else 'false'}"
-        ],
-        "networks": {
-            subnet: {"aliases": [node_name]}
-        },
-        "deploy": {
-            "resources": {
-                "limits": {
-                    "cpus": cpu_limit,
-                    "memory": mem_limit
-                }
-            }
-        }
+
+
+def pick_next_nodes(nodes, max_neighbors, rng):
+    """NEXT_NODES for every (name, port, networks) in nodes: max_neighbors random nodes sharing a network.
+
+    Candidates are taken in nodes order, and a node on one network samples
+    indices into its network's member list, so large meshes never build a
+    candidate list per node.
+    """
+    members = {}
+    for idx, (_, _, networks) in enumerate(nodes):
+        for network in networks:
+            members.setdefault(network, []).append(idx)
+    next_nodes = []
+    for idx, (_, _, networks) in enumerate(nodes):
+        if len(networks) == 1:
+            pool = members[networks[0]]
+            own = bisect.bisect_left(pool, idx)
+            picks = [pool[j + (j >= own)] for j in rng.sample(range(len(pool) - 1), k=min(max_neighbors, len(pool) - 1))]
+        else:
+            pool = sorted(set().union(*(members[network] for network in networks)) - {idx})
+            picks = [pool[j] for j in rng.sample(range(len(pool)), k=min(max_neighbors, len(pool)))]
+        next_nodes.append([f"{nodes[j][0]}:{nodes[j][1]}" for j in picks])
+    return next_nodes
+
+
+def mesh_topology(num_nodes, max_neighbors, subnet_count, rng, base_port=5000):
+    """[(name, port, networks, next_nodes, start_node)] split over subnet_count subnets.
+
+    Node i is in subnet (i - 1) // ceil(num_nodes / subnet_count). An extra
+    bridge node joins every pair of subnets, on the ports after the last node.
+    Every node forwards to max_neighbors random nodes it shares a subnet with,
+    and node1 sends readings.
+    sweep.py, flood_model.py and simulate_mesh.py build their topologies here too.
+    """
+    nodes_per_subnet = math.ceil(num_nodes / subnet_count)
+    subnet_names = [f"meshnet{i+1}" for i in range(subnet_count)]
+    nodes = [(f"node{i}", base_port + i, [subnet_names[min((i - 1) // nodes_per_subnet, subnet_count - 1)]])
+             for i in range(1, num_nodes + 1)]
+
+    # Bridge nodes for every pair of subnets
+    for bridge_node_idx, (subnet_a, subnet_b) in enumerate(combinations(subnet_names, 2), num_nodes + 1):
+        nodes.append((f"bridge_{subnet_a}_{subnet_b}", base_port + bridge_node_idx, [subnet_a, subnet_b]))
+
+    return [(name, port, networks, next_nodes, name == "node1")
+            for (name, port, networks), next_nodes in zip(nodes, pick_next_nodes(nodes, max_neighbors, rng))]
+
+
+if __name__ == "__main__":
+    seed = int(os.getenv("SEED") or random.randrange(2 ** 32))  # SEED=<n> regenerates the same topology
+    rng = random.Random(seed)
+    subnet_names = [f"meshnet{i+1}" for i in range(subnet_count)]
+
+    # Initialize docker-compose structure
+    compose = {
+        "services": {},
+        "networks": {subnet: {"driver": "bridge"} for subnet in subnet_names}
     }
 
-# Add bridge nodes for every pair of subnets
-bridge_pairs = list(combinations(subnet_names, 2))
-bridge_node_idx = num_nodes + 1  # Start after the last regular node
-for subnet_a, subnet_b in bridge_pairs:
-    node_name = f"bridge_{subnet_a}_{subnet_b}"
-    compose["services"][node_name] = {
-        "build": ".",
-        "container_name": node_name,
-        "environment": [
-            f"NODE_NAME={node_name}",
-            f"LISTEN_PORT={base_port + bridge_node_idx}",
-            f"NEXT_NODES=PLACEHOLDER",
-            f"START_NODE=false"
-        ],
-        "networks": {
-            subnet_a: {"aliases": [node_name]},
-            subnet_b: {"aliases": [node_name]}
-        },
-        "deploy": {
-            "resources": {
-                "limits": {
-                    "cpus": cpu_limit,
-                    "memory": mem_limit
+    # Create regular node and bridge services
+    for node_name, listen_port, networks, next_nodes, start_node in mesh_topology(
+            num_nodes, max_neighbors, subnet_count, rng, base_port):
+        compose["services"][node_name] = {
+            "build": ".",
+            "container_name": node_name,
+            "environment": [
+                f"NODE_NAME={node_name}",
+                f"LISTEN_PORT={listen_port}",
+                f"NEXT_NODES={','.join(next_nodes)}",
+                f"START_NODE={'true' if start_node else 'false'}",
+                f"SEED={seed}"  # nodes seed their own random decisions from it
+            ],
+            "networks": {
+                subnet: {"aliases": [node_name]} for subnet in networks
+            },
+            "deploy": {
+                "resources": {
+                    "limits": {
+                        "cpus": cpu_limit,
+                        "memory": mem_limit
+                    }
                 }
             }
         }
-    }
-    bridge_node_idx += 1
-
-# Now, update NEXT_NODES for all nodes (including bridges)
-all_node_names = list(compose["services"].keys())
-for node_name in all_node_names:
-    service = compose["services"][node_name]
-    node_networks = set(service["networks"].keys())
-    # Find all nodes that share at least one subnet with this node
-    reachable_nodes = []
-    for other_node in all_node_names:
-        if other_node == node_name:
-            continue
-        other_networks = set(compose["services"][other_node]["networks"].keys())
-        if node_networks & other_networks:
-            # Use the correct port for each node
-            env = compose["services"][other_node]["environment"]
-            listen_port = None
-            for var in env:
-                if var.startswith("LISTEN_PORT="):
-                    listen_port = var.split("=", 1)[1]
-                    break
-            if listen_port:
-                reachable_nodes.append(f"{other_node}:{listen_port}")
-    next_nodes = random.sample(reachable_nodes, k=min(max_neighbors, len(reachable_nodes)))
-    # Update environment
-    env = service["environment"]
-    for idx, var in enumerate(env):
-        if var.startswith("NEXT_NODES="):
-            env[idx] = f"NEXT_NODES={','.join(next_nodes)}"
-            break
-
-# Output to YAML
-with open("docker-compose.yml", "w") as f:
-    yaml.dump(compose, f, default_flow_style=False)
-
-print(f"✅ Generated docker-compose-subnet.yml for {num_nodes} nodes across {subnet_count} subnets, with full inter-subnet bridges.")
+
+    # Output to YAML
+    with open("docker-compose.yml", "w") as f:
+        yaml.dump(compose, f, default_flow_style=False)
+
+    # The same topology for host mode (HOST_NODES=host_nodes.txt python node.py), one node per line
+    with open("host_nodes.txt", "w") as f:
+        for service in compose["services"].values():
+            f.write(" ".join(service["environment"]) + "\n")
+
+    print(f"✅ Generated docker-compose-subnet.yml for {num_nodes} nodes across {subnet_count} subnets, with full inter-subnet bridges (seed {seed}).")
@@ -49,6 +49,7 @@ for i in $(seq 1 150); do
     if docker ps -a --format '{{.Names}}' | grep -q "^$container$"; then
         echo "Fetching log from $container..."
         docker cp $container:/app/events.json ./collected_logs/${container}_events.json 2>/dev/null || echo "  No events.json found in $container"
+        docker cp $container:/app/stats.json ./collected_logs/${container}_stats.json 2>/dev/null || true
     fi
 done
 echo "✅ Done fetching logs. Check ./collected_logs/"
@@ -247,6 +247,7 @@ energy_data.columns = ["node", "received"]
 energy_data["sent"] = df["from"].value_counts()
 energy_data = energy_data.fillna(0)
 energy_data["energy"] = energy_data["sent"] * 1 + energy_data["received"] * 0.5
+energy_per_delivery = energy_data["energy"].sum() / df.drop_duplicates(subset=["msg_id", "node"]).shape[0]
 energy_data.to_csv(data_dir / "node_energy.csv", index=False)
 plt.figure(figsize=(12, 6))
 sns.barplot(x="node", y="energy", data=energy_data.sort_values("energy", ascending=False).head(20))
@@ -279,6 +280,23 @@ fairness_index = (node_counts.sum() ** 2) / (n * (node_counts**2).sum())
 latency.to_csv(data_dir / "latency_summary.csv")
 node_msg_counts.to_csv(data_dir / "node_load.csv")
 
+# ----------------------------
+# Link-layer counters (stats.json per node, when collected)
+# ----------------------------
+link_stats, airtime_stats = [], []
+for file in log_dir.glob("*_stats.json"):
+    try:
+        node_stats = json.loads(file.read_text())
+    except (OSError, ValueError):
+        continue
+    link_stats.append(node_stats.get("link", {}))
+    airtime_stats.append(node_stats.get("airtime", {}))
+link_totals = {key: sum(s.get(key, 0) for s in link_stats)
+               for key in ("tx_datagrams", "tx_bytes", "retransmits", "acks_sent", "acked", "gave_up")}
+airtime_totals = {key: sum(s.get(key, 0) for s in airtime_stats)
+                  for key in ("airtime_s", "deferred", "dropped", "wait_s")}
+deliveries = df.drop_duplicates(subset=["msg_id", "node"]).shape[0]
+
 # Append to report
 with open(data_dir / "mesh_metrics.txt", "a") as f:
     f.write("\n5. Advanced Metrics\n")
@@ -296,11 +314,19 @@ with open(data_dir / "mesh_metrics.txt", "a") as f:
     f.write("-" * 20 + "\n")
     f.write(f"Top Energy Node: {energy_data.sort_values('energy', ascending=False).iloc[0]['node']} with {energy_data['energy'].max()} units\n")
     f.write(f"Avg Energy Used per Node: {energy_data['energy'].mean():.2f} units\n")
+    f.write(f"Energy per Delivered Message: {energy_per_delivery:.2f} units\n")
     
     f.write("\n8. Spread Efficiency\n---------------------\n")
     f.write(f"Average Spread Efficiency (reach / hops): {avg_spread_efficiency:.4f}\n")
     f.write("\n9. Network Fairness\n---------------------\n")
     f.write(f"Jain's Fairness Index on Node Load: {fairness_index:.4f}\n")
+    if link_stats:
+        f.write("\n10. Link Layer\n---------------------\n")
+        f.write(f"Datagrams Sent: {link_totals['tx_datagrams']} ({link_totals['tx_bytes']} bytes)\n")
+        f.write(f"Retransmissions: {link_totals['retransmits']}, ACKs Sent: {link_totals['acks_sent']}, Given Up: {link_totals['gave_up']}\n")
+        f.write(f"Datagrams per Delivery: {link_totals['tx_datagrams'] / deliveries:.2f}\n")
+        f.write(f"Time on Air: {airtime_totals['airtime_s']:.2f} s ({airtime_totals['airtime_s'] / deliveries:.3f} s per delivery)\n")
+        f.write(f"Duty Cycle: {airtime_totals['deferred']} deferred ({airtime_totals['wait_s']:.2f} s waiting), {airtime_totals['dropped']} dropped\n")
 
 
 
@@ -5,137 +5,1893 @@ import time
 import json
 import uuid
 import random
-import subprocess
+import asyncio
+import queue
+import signal
+import sys
+import math
+import hashlib
+import struct
+import heapq
+import itertools
+import bisect
+import multiprocessing
+import sqlite3
+from collections import OrderedDict, deque
 
 NODE_NAME = os.getenv("NODE_NAME", "nodeX")
 PORT = int(os.getenv("LISTEN_PORT", "5000"))
 START_NODE = os.getenv("START_NODE", "false").lower() == "true"
 SERVICE_NAME = "mesh-node.default.svc.cluster.local"
-PEER_REFRESH_INTERVAL = 300  # refresh peers every 5 minutes
-PACKET_DROP_RATE = 0.02  # 2% packet loss simulation
+PEER_REFRESH_INTERVAL = float(os.getenv("PEER_REFRESH_INTERVAL", "300"))  # seconds between DNS refreshes of the peer list
+PEER_REFRESH_JITTER = float(os.getenv("PEER_REFRESH_JITTER", "0.2"))  # +/- fraction, so pods don't all query DNS at once
+PEER_RETRY_INTERVAL = float(os.getenv("PEER_RETRY_INTERVAL", "1"))  # seconds between DNS retries until the first peer is found
+PEERS_FILE = os.getenv("PEERS_FILE", "")  # optional mounted EndpointSlice JSON or address list; replaces DNS polling
+PEERS_FILE_POLL = float(os.getenv("PEERS_FILE_POLL", "1"))  # seconds between PEERS_FILE mtime checks
+PEER_SAMPLING = os.getenv("PEER_SAMPLING", "off").lower()  # "off" (2-4 random peers per forward) or "views"
+ACTIVE_VIEW = int(os.getenv("ACTIVE_VIEW", "4"))  # views: peers every message is forwarded to
+PASSIVE_VIEW = int(os.getenv("PASSIVE_VIEW", "24"))  # views: backup peers, refreshed by shuffles
+SHUFFLE_LENGTH = int(os.getenv("SHUFFLE_LENGTH", "6"))  # views: addresses exchanged per shuffle
+VIEW_TICK = float(os.getenv("VIEW_TICK", "2"))  # views: seconds between ping/shuffle rounds
+VIEW_SWITCH_MARGIN = float(os.getenv("VIEW_SWITCH_MARGIN", "0.3"))  # views: RTT improvement needed to swap an active peer
+PACKET_DROP_RATE = float(os.getenv("PACKET_DROP_RATE", "0.02"))  # chance a sensor cycle is skipped (2% packet loss simulation)
+RUNTIME = os.getenv("RUNTIME", "thread").lower()  # "thread" (blocking loop), "batch" (drain/flush loop) or "asyncio"
+IO_BATCH_MAX = int(os.getenv("IO_BATCH_MAX", "64"))  # datagrams drained per wakeup in batch mode
+SEND_MODE = os.getenv("SEND_MODE", "shared").lower()  # "shared" or "connected" (one socket per neighbor)
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "64"))  # events per write
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))  # max seconds an event waits in memory
+DEDUP_MODE = os.getenv("DEDUP_MODE", "ttl").lower()  # "ttl" (exact, bounded) or "bloom" (rotating Bloom filter)
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "600"))  # seconds a message id is remembered
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "10000"))  # ids held at once (bloom: per generation)
+DEDUP_FP_RATE = float(os.getenv("DEDUP_FP_RATE", "0.001"))  # bloom mode only
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "60"))  # seconds between stats lines in the node log
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "json").lower()  # format we send: "json" or "binary"; both are accepted
+MSG_TTL = int(os.getenv("MSG_TTL", "25"))  # hops a sensor reading may travel
+FANOUT = int(os.getenv("FANOUT", "0"))  # peers per forward without views, 0 picks 2-4 at random
+LOSS_RATE = float(os.getenv("LOSS_RATE", "0"))  # chance each received datagram is dropped, to emulate a lossy link
+FORWARD_STRATEGY = os.getenv("FORWARD_STRATEGY", "flood").lower()  # "flood", "gossip", "counter" or "hop"
+GOSSIP_PROB = float(os.getenv("GOSSIP_PROB", "0.65"))  # gossip: chance a relay rebroadcasts
+GOSSIP_MIN_HOPS = int(os.getenv("GOSSIP_MIN_HOPS", "2"))  # gossip: always rebroadcast up to this hop so floods don't die early
+COUNTER_THRESHOLD = int(os.getenv("COUNTER_THRESHOLD", "3"))  # counter: skip the rebroadcast once this many copies were heard
+COUNTER_WINDOW = float(os.getenv("COUNTER_WINDOW", "0.05"))  # counter: max random wait (s) spent listening for copies
+HOP_DECAY = float(os.getenv("HOP_DECAY", "0.1"))  # hop: rebroadcast chance lost per hop travelled
+HOP_MIN_PROB = float(os.getenv("HOP_MIN_PROB", "0.3"))  # hop: floor for the rebroadcast chance
+HOLDER_TRACKING = os.getenv("HOLDER_TRACKING", "off").lower()  # "off", "seen" (per-node seen-from sets) or "path" (ids carried in the message)
+PATH_MAX = int(os.getenv("PATH_MAX", "4"))  # path mode: most recent node ids carried per message
+PATH_ID = os.getenv("POD_IP") or NODE_NAME  # path mode: this pod's IP, which is how peers address it
+AGGREGATE_WINDOW = float(os.getenv("AGGREGATE_WINDOW", "0"))  # seconds a relay holds forwards to coalesce them, 0 disables
+AGGREGATE_MAX_BYTES = int(os.getenv("AGGREGATE_MAX_BYTES", "1400"))  # bundle size cap; must fit the 2048-byte receive buffer
+INGRESS_QUEUE = int(os.getenv("INGRESS_QUEUE", "0"))  # bounded ingress queue length, 0 handles datagrams inline
+INGRESS_RATE = float(os.getenv("INGRESS_RATE", "200"))  # datagrams/s admitted per source address
+INGRESS_BURST = float(os.getenv("INGRESS_BURST", "50"))  # per-source token bucket depth
+INGRESS_FRESH_HOPS = int(os.getenv("INGRESS_FRESH_HOPS", "2"))  # messages up to this hop are fresh readings (served first)
+MAX_DATAGRAM = 2048  # largest datagram we accept; anything bigger is counted and dropped
+RELIABLE = os.getenv("RELIABLE", "false").lower() == "true"  # per-hop ACKs and retransmission for what we send
+RETRANSMIT_BUFFER = int(os.getenv("RETRANSMIT_BUFFER", "256"))  # unacknowledged datagrams kept for retransmission
+RETRY_BASE = float(os.getenv("RETRY_BASE", "0.2"))  # first retransmit timeout in seconds, doubled per attempt
+RETRY_MAX = int(os.getenv("RETRY_MAX", "4"))  # retransmissions before a datagram is given up
+ACK_DELAY = float(os.getenv("ACK_DELAY", "0.02"))  # receivers batch ACKs per peer for this long
+ANTI_ENTROPY_INTERVAL = float(os.getenv("ANTI_ENTROPY_INTERVAL", "0"))  # seconds between digest exchanges, 0 disables
+ANTI_ENTROPY_WINDOW = float(os.getenv("ANTI_ENTROPY_WINDOW", "60"))  # how far back digests and repairs reach
+ANTI_ENTROPY_KEEP = int(os.getenv("ANTI_ENTROPY_KEEP", "256"))  # recent messages kept for repairs
+ANTI_ENTROPY_MAX = int(os.getenv("ANTI_ENTROPY_MAX", "16"))  # messages repaired per digest
+GATEWAY = os.getenv("GATEWAY", "false").lower() == "true"  # sink role: store every unique uplink in GATEWAY_DB
+GATEWAY_DB = os.getenv("GATEWAY_DB", "uplinks.db")  # SQLite file, opened in WAL mode
+GATEWAY_BATCH = int(os.getenv("GATEWAY_BATCH", "500"))  # rows per insert transaction
+GATEWAY_FLUSH_INTERVAL = float(os.getenv("GATEWAY_FLUSH_INTERVAL", "0.5"))  # max seconds an uplink waits in memory
+GATEWAY_RELAY = os.getenv("GATEWAY_RELAY", "false").lower() == "true"  # keep relaying as well as storing
+LORA_SF = int(os.getenv("LORA_SF", "7"))  # spreading factor 7-12
+LORA_BW = float(os.getenv("LORA_BW", "125000"))  # bandwidth in Hz
+LORA_CR = int(os.getenv("LORA_CR", "1"))  # coding rate 4/(4+LORA_CR), 1-4
+LORA_PREAMBLE = int(os.getenv("LORA_PREAMBLE", "8"))  # preamble symbols
+DUTY_CYCLE = float(os.getenv("DUTY_CYCLE", "0"))  # max fraction of DUTY_WINDOW on air, e.g. 0.01; 0 only counts airtime
+DUTY_WINDOW = float(os.getenv("DUTY_WINDOW", "3600"))  # seconds the duty-cycle budget is measured over
+DUTY_POLICY = os.getenv("DUTY_POLICY", "defer").lower()  # "defer" (hold until the budget allows) or "drop"
+DUTY_MAX_WAIT = float(os.getenv("DUTY_MAX_WAIT", "60"))  # defer: drop instead of waiting longer than this
+LORA_MAX_PAYLOAD = 255  # largest LoRa PHY payload in bytes
+LORA_FRAME_ROOM = LORA_MAX_PAYLOAD - (9 if RELIABLE else 0)  # what a frame may carry once RELIABLE adds its header
+# while DUTY_CYCLE emulates the radio, a bundle must fit one LoRa frame
+BUNDLE_MAX_BYTES = min(AGGREGATE_MAX_BYTES, LORA_FRAME_ROOM) if DUTY_CYCLE > 0 else AGGREGATE_MAX_BYTES
+SEED = os.getenv("SEED", "")  # seeds random per node (with NODE_NAME) so runs repeat; empty leaves it unseeded
+RANDOM_RECORD = os.getenv("RANDOM_RECORD", "")  # file to append every random decision and sensor reading to
+RANDOM_REPLAY = os.getenv("RANDOM_REPLAY", "")  # comma-separated RANDOM_RECORD files whose decisions are taken again
+WORKERS = int(os.getenv("WORKERS", "1"))  # receive processes sharing LISTEN_PORT via SO_REUSEPORT
 
-RECEIVED_IDS = set()
 KNOWN_PEERS = []
-last_peer_refresh = 0
+
+WIRE_VERSION = 1  # first byte of a binary datagram; JSON datagrams always start with "{"
+_FLAG_SENSOR = 0x01  # payload is temperature/humidity in hundredths
+_FLAG_PAYLOAD_JSON = 0x02  # payload is an embedded JSON blob
+_FLAG_EXTRA = 0x04  # trailing JSON object with any fields beyond the core six
+_SENSOR = struct.Struct(">hH")
+_CORE_FIELDS = ("id", "src", "payload", "hop", "ttl", "ts")
+
+def _put_varint(buf, n):
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)  # negative n raises ValueError here
+
+def _get_varint(data, pos):
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+def _put_blob(buf, obj):
+    blob = json.dumps(obj, separators=(",", ":")).encode()
+    _put_varint(buf, len(blob))
+    buf += blob
+
+def _get_blob(data, pos):
+    n, pos = _get_varint(data, pos)
+    return json.loads(bytes(data[pos:pos + n])), pos + n
+
+def encode_binary(msg):
+    """Compact layout: version, flags, 16-byte id, varint hop/ttl/ts(ms), src, payload[, extra].
+
+    Raises ValueError/KeyError/TypeError for messages the layout cannot carry.
+    """
+    buf = bytearray((WIRE_VERSION, 0))
+    buf += uuid.UUID(msg["id"]).bytes
+    _put_varint(buf, msg["hop"])
+    _put_varint(buf, msg["ttl"])
+    _put_varint(buf, round(msg["ts"] * 1000))
+    src = msg["src"].encode()
+    _put_varint(buf, len(src))
+    buf += src
+
+    flags = 0
+    payload = msg["payload"]
+    if isinstance(payload, dict) and payload.keys() == {"temperature", "humidity"}:
+        try:
+            buf += _SENSOR.pack(round(payload["temperature"] * 100), round(payload["humidity"] * 100))
+            flags |= _FLAG_SENSOR
+        except struct.error:
+            pass  # out of fixed-point range
+    if not flags & _FLAG_SENSOR:
+        _put_blob(buf, payload)
+        flags |= _FLAG_PAYLOAD_JSON
+
+    extra = {k: v for k, v in msg.items() if k not in _CORE_FIELDS}
+    if extra:
+        _put_blob(buf, extra)
+        flags |= _FLAG_EXTRA
+    buf[1] = flags
+    return bytes(buf)
+
+def decode_binary(data):
+    if data[0] != WIRE_VERSION:
+        raise ValueError(f"unsupported wire version {data[0]}")
+    flags = data[1]
+    msg_id = str(uuid.UUID(bytes=bytes(data[2:18])))
+    hop, pos = _get_varint(data, 18)
+    ttl, pos = _get_varint(data, pos)
+    ts_ms, pos = _get_varint(data, pos)
+    n, pos = _get_varint(data, pos)
+    src = bytes(data[pos:pos + n]).decode()
+    pos += n
+
+    if flags & _FLAG_SENSOR:
+        temperature, humidity = _SENSOR.unpack_from(data, pos)
+        pos += _SENSOR.size
+        payload = {"temperature": temperature / 100, "humidity": humidity / 100}
+    else:
+        payload, pos = _get_blob(data, pos)
+
+    msg = {"id": msg_id, "src": src, "payload": payload, "hop": hop, "ttl": ttl, "ts": ts_ms / 1000}
+    if flags & _FLAG_EXTRA:
+        extra, pos = _get_blob(data, pos)
+        msg.update(extra)
+    return msg
+
+def encode_message(msg):
+    if WIRE_FORMAT == "binary":
+        try:
+            return encode_binary(msg)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            pass  # not representable; JSON is always understood
+    return json.dumps(msg).encode()
+
+def decode_message(data):
+    """Accepts both wire formats, so JSON and binary nodes can share a mesh during rollout."""
+    if data and data[0] < 0x09:  # below any byte a JSON document can start with
+        return decode_binary(data)
+    return json.loads(data.decode())
+
+BUNDLE_MARK = 0x02  # first byte of a coalesced datagram: length-prefixed messages follow
+
+def bundle(parts):
+    """Pack several encoded messages into one datagram; each keeps its own id/hop/ttl."""
+    buf = bytearray([BUNDLE_MARK])
+    for part in parts:
+        _put_varint(buf, len(part))
+        buf += part
+    return bytes(buf)
+
+def unbundle(data):
+    if not data or data[0] != BUNDLE_MARK:
+        return [data]
+    parts = []
+    pos = 1
+    while pos < len(data):
+        n, pos = _get_varint(data, pos)
+        parts.append(data[pos:pos + n])
+        pos += n
+    return parts
+
+class SenderPool:
+    """Outgoing UDP sockets, created once and reused for every send.
+
+    "shared" sends everything through one socket. "connected" keeps one connected
+    socket per neighbor (capped), which saves the kernel a route lookup per send.
+    """
+
+    def __init__(self, mode="shared", max_connected=64):
+        self.mode = mode
+        self.max_connected = max_connected
+        self.shared = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.connected = {}
+        self.lock = threading.Lock()
+
+    def _connected_sock(self, addr):
+        sock = self.connected.get(addr)
+        if sock is not None or len(self.connected) >= self.max_connected:
+            return sock
+        with self.lock:
+            sock = self.connected.get(addr)
+            if sock is None:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                try:
+                    sock.connect(addr)
+                except OSError as e:
+                    sock.close()
+                    print(f"[{NODE_NAME}] Could not connect sender to {addr[0]}:{addr[1]}: {e}", flush=True)
+                    return None
+                self.connected[addr] = sock
+        return sock
+
+    def sendto(self, data, addr):
+        if self.mode == "connected":
+            sock = self._connected_sock(addr)
+            if sock is not None:
+                return sock.send(data)
+        return self.shared.sendto(data, addr)
+
+    def close(self):
+        for sock in self.connected.values():
+            sock.close()
+        self.connected.clear()
+        self.shared.close()
+
+SENDERS = SenderPool(SEND_MODE)
+
+class EventLog:
+    """JSON-lines event log written by a background thread.
+
+    Callers only enqueue; the writer serializes and appends in batches of up to
+    batch_size lines, or every flush_interval seconds, whichever comes first.
+    A single FIFO queue and writer keep the events in the order they were logged.
+    """
+
+    def __init__(self, path, batch_size=64, flush_interval=1.0, max_pending=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)  # full queue blocks callers instead of dropping events
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def log(self, entry):
+        self.queue.put(entry)
+
+    def close(self, timeout=5):
+        # Safe from a signal handler: no queue.put, which could deadlock on a full queue
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        with open(self.path, "ab", buffering=0) as f:
+            while not self.stopping.is_set():
+                # short waits so close() is noticed promptly even with a long flush_interval
+                wait = min(deadline - time.monotonic(), 0.25)
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, wait)))
+                except queue.Empty:
+                    pass
+                if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                    self._write(f, batch)
+                    batch = []
+                    deadline = time.monotonic() + self.flush_interval
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(f, batch)
+
+    def _write(self, f, batch):
+        # one unbuffered O_APPEND write per batch, so lines from several workers never interleave
+        if batch:
+            f.write(("\n".join(json.dumps(entry) for entry in batch) + "\n").encode())
+
+EVENT_LOG = EventLog("events.json", LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL)
+
+class GatewayStore:
+    """Uplink store for the gateway role, written by a background thread.
+
+    Uplinks are queued by the receive path and inserted in batches of up to
+    batch_size rows, one transaction per batch, with a single prepared
+    INSERT OR IGNORE. msg_id is the primary key, so copies that reach the
+    gateway over several paths, through several workers or after a restart
+    are stored once.
+    """
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS uplinks (msg_id TEXT PRIMARY KEY, src TEXT, temperature REAL, "
+              "humidity REAL, payload TEXT, hop INTEGER, sent_ts REAL, received_ts REAL, via TEXT)")
+    INSERT = "INSERT OR IGNORE INTO uplinks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5, max_pending=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)  # full queue blocks the receive path: backpressure, not loss
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.counters = {"received": 0, "stored": 0, "duplicates": 0, "batches": 0}
+        self.started = time.monotonic()
+        self.last = (self.started, 0)  # (time, stored) at the previous stats() call
+
+    def start(self):
+        self.thread.start()
+
+    def add(self, msg, addr):
+        payload = msg.get("payload")
+        sensor = payload if isinstance(payload, dict) else {}
+        self.queue.put((msg["id"], msg.get("src"), sensor.get("temperature"), sensor.get("humidity"),
+                        json.dumps(payload), msg["hop"], msg.get("ts"), time.time(), addr[0]))
+        self.counters["received"] += 1
+
+    def close(self, timeout=5):
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def _run(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; only the last commits can be lost on power failure
+        db.execute(self.SCHEMA)
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self.stopping.is_set():
+            wait = min(deadline - time.monotonic(), 0.25)
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, wait)))
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(db, batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._write(db, batch)
+        db.close()
+
+    def _write(self, db, batch):
+        if not batch:
+            return
+        before = db.total_changes
+        db.execute("BEGIN")
+        db.executemany(self.INSERT, batch)
+        db.execute("COMMIT")
+        stored = db.total_changes - before
+        self.counters["stored"] += stored
+        self.counters["duplicates"] += len(batch) - stored
+        self.counters["batches"] += 1
+
+    def stats(self):
+        now, stored = time.monotonic(), self.counters["stored"]
+        then, stored_then = self.last
+        self.last = (now, stored)
+        return dict(self.counters, pending=self.queue.qsize(),
+                    uplinks_per_s=round((stored - stored_then) / max(now - then, 1e-9), 1),
+                    avg_uplinks_per_s=round(stored / max(now - self.started, 1e-9), 1))
+
+GATEWAY_STORE = GatewayStore(GATEWAY_DB, GATEWAY_BATCH, GATEWAY_FLUSH_INTERVAL)
+
+class DedupCache:
+    """Seen-message ids with bounded memory.
+
+    Ids expire ttl seconds after first sight, and the oldest are evicted once
+    max_entries is reached, so a long run keeps a flat footprint.
+    """
+
+    def __init__(self, ttl=600.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # msg_id -> first-seen time, oldest first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def seen(self, msg_id):
+        """True if msg_id is a duplicate; otherwise remember it and return False."""
+        now = time.monotonic()
+        with self.lock:
+            while self.entries and next(iter(self.entries.values())) < now - self.ttl:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            if msg_id in self.entries:
+                self.hits += 1
+                return True
+            self.misses += 1
+            self.entries[msg_id] = now
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            return False
+
+    def stats(self):
+        return {"mode": "ttl", "size": len(self.entries), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+class RotatingBloomFilter:
+    """Two-generation Bloom filter for dedup in constant memory.
+
+    New ids go into the current generation; lookups check current and previous.
+    A generation is retired after ttl seconds or capacity inserts, so ids are
+    remembered for at least one generation. Each generation is sized for half of
+    fp_rate, which keeps the combined false-positive rate near fp_rate.
+    """
+
+    def __init__(self, ttl=600.0, capacity=10000, fp_rate=0.001):
+        self.ttl = ttl
+        self.capacity = capacity
+        per_filter = fp_rate / 2
+        self.num_bits = max(8, int(-capacity * math.log(per_filter) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.current = bytearray((self.num_bits + 7) // 8)
+        self.previous = bytearray(len(self.current))
+        self.current_count = 0
+        self.previous_count = 0
+        self.rotated_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _positions(self, msg_id):
+        digest = hashlib.blake2b(str(msg_id).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    @staticmethod
+    def _contains(bits, positions):
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def _rotate(self):
+        self.evictions += self.previous_count
+        self.previous = self.current
+        self.previous_count = self.current_count
+        self.current = bytearray(len(self.previous))
+        self.current_count = 0
+        self.rotated_at = time.monotonic()
+
+    def seen(self, msg_id):
+        """True if msg_id is (probably) a duplicate; otherwise remember it and return False."""
+        positions = self._positions(msg_id)
+        with self.lock:
+            if self.current_count >= self.capacity or time.monotonic() - self.rotated_at > self.ttl:
+                self._rotate()
+            if self._contains(self.current, positions) or self._contains(self.previous, positions):
+                self.hits += 1
+                return True
+            self.misses += 1
+            for p in positions:
+                self.current[p >> 3] |= 1 << (p & 7)
+            self.current_count += 1
+            return False
+
+    def stats(self):
+        return {"mode": "bloom", "size": self.current_count + self.previous_count, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "bytes": len(self.current) * 2, "hashes": self.num_hashes}
+
+if DEDUP_MODE == "bloom":
+    RECEIVED_IDS = RotatingBloomFilter(DEDUP_TTL, DEDUP_MAX_ENTRIES, DEDUP_FP_RATE)
+else:
+    RECEIVED_IDS = DedupCache(DEDUP_TTL, DEDUP_MAX_ENTRIES)
+
+class SharedDedup:
+    """Dedup table in shared memory, so SO_REUSEPORT workers forward each id once.
+
+    Fixed set-associative table of 64-bit id fingerprints (4 ways per bucket)
+    with first-seen times. Entries older than ttl count as empty, and a full
+    bucket overwrites its oldest way. Memory is 16 bytes per slot, allocated
+    before the workers fork.
+    """
+
+    WAYS = 4
+
+    def __init__(self, ttl=600.0, max_entries=10000):
+        self.ttl = ttl
+        self.buckets = max(1, max_entries // self.WAYS)
+        self.fingerprints = multiprocessing.RawArray("Q", self.buckets * self.WAYS)  # 0 = empty
+        self.seen_at = multiprocessing.RawArray("d", self.buckets * self.WAYS)
+        self.counters = multiprocessing.RawArray("Q", 3)  # hits, misses, evictions
+        self.lock = multiprocessing.Lock()
+
+    def seen(self, msg_id):
+        """True if any worker already saw msg_id; otherwise remember it and return False."""
+        fp = int.from_bytes(hashlib.blake2b(str(msg_id).encode(), digest_size=8).digest(), "little") or 1
+        base = (fp % self.buckets) * self.WAYS
+        now = time.monotonic()  # CLOCK_MONOTONIC is system-wide, so comparable across workers
+        with self.lock:
+            victim, victim_time = base, float("inf")
+            for slot in range(base, base + self.WAYS):
+                occupied = self.fingerprints[slot] != 0 and now - self.seen_at[slot] <= self.ttl
+                if occupied and self.fingerprints[slot] == fp:
+                    self.counters[0] += 1
+                    return True
+                slot_time = self.seen_at[slot] if occupied else float("-inf")
+                if slot_time < victim_time:
+                    victim, victim_time = slot, slot_time
+            if self.fingerprints[victim] != 0:
+                self.counters[2] += 1
+            self.fingerprints[victim] = fp
+            self.seen_at[victim] = now
+            self.counters[1] += 1
+            return False
+
+    def stats(self):
+        return {"mode": "shared", "size": sum(1 for fp in self.fingerprints if fp), "hits": self.counters[0],
+                "misses": self.counters[1], "evictions": self.counters[2], "workers": WORKERS}
+
+WORKER_ID = 0
+CHILD_PIDS = []
+
+def spawn_workers():
+    """Fork WORKERS-1 extra receive workers before any thread starts. Returns this process's index."""
+    global RECEIVED_IDS, WORKER_ID, CHILD_PIDS
+    RECEIVED_IDS = SharedDedup(DEDUP_TTL, DEDUP_MAX_ENTRIES)
+    for i in range(1, WORKERS):
+        pid = os.fork()
+        if pid == 0:
+            WORKER_ID = i
+            CHILD_PIDS = []
+            seed_random(i)  # a forked child's random is reseeded from the OS
+            DECISIONS.reopen(i)
+            return i
+        CHILD_PIDS.append(pid)
+    return 0
+
+def bind_listen_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if WORKERS > 1:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)  # kernel spreads datagrams across workers
+    sock.bind(("", PORT))
+    return sock
+
+def node_stats():
+    return {"dedup": RECEIVED_IDS.stats(), "forwarding": dict(FORWARD_STATS, strategy=FORWARD_STRATEGY),
+            "aggregation": COALESCER.stats(), "ingress": INGRESS.stats(), "delayed_sends_pending": SCHEDULER.pending(),
+            "link": LINK.stats(), "airtime": AIRTIME.stats(), "anti_entropy": ANTI_ENTROPY.stats(),
+            "gateway": GATEWAY_STORE.stats() if GATEWAY else None,
+            "views": SAMPLER.stats() if PEER_SAMPLING == "views" else None,
+            "decisions": DECISIONS.stats() if RANDOM_RECORD or RANDOM_REPLAY else None}
+
+def write_stats_file(stats):
+    """stats.json is collected next to events.json; analyze_mesh.py sums its link counters."""
+    with open("stats.json.tmp", "w") as f:
+        json.dump(dict(stats, node=NODE_NAME), f)
+    os.replace("stats.json.tmp", "stats.json")
+
+def report_stats_periodically():
+    last_print = time.monotonic()
+    while True:
+        time.sleep(min(STATS_INTERVAL, 5))
+        stats = node_stats()
+        if WORKER_ID == 0:
+            write_stats_file(stats)
+        if time.monotonic() - last_print >= STATS_INTERVAL:
+            last_print = time.monotonic()
+            print(f"[{NODE_NAME}] Stats: {json.dumps(stats)}", flush=True)
+
+def shutdown(signum, frame):
+    for pid in CHILD_PIDS:
+        os.kill(pid, signal.SIGTERM)
+    for pid in CHILD_PIDS:
+        os.waitpid(pid, 0)
+    print(f"[{NODE_NAME}] Shutting down, flushing event log...", flush=True)
+    stats = node_stats()
+    print(f"[{NODE_NAME}] Stats: {json.dumps(stats)}", flush=True)
+    if WORKER_ID == 0:
+        write_stats_file(stats)
+    EVENT_LOG.close()
+    GATEWAY_STORE.close()
+    DECISIONS.close()
+    SENDERS.close()
+    sys.exit(0)
+
+class Neighbor:
+    """One next-hop peer, parsed and resolved once instead of on every send."""
+
+    def __init__(self, host, port, link="direct", delay=0.0):
+        self.host = host
+        self.port = port
+        self.link = link
+        self.delay = delay
+        self.sockaddr = None  # (ip, port) once resolved
+        self.stale = True  # needs a (re)resolve
+
+    def resolve(self):
+        try:
+            self.sockaddr = (socket.gethostbyname(self.host), self.port)
+            self.stale = False
+        except OSError as e:
+            print(f"[{NODE_NAME}] Could not resolve {self.host}: {e}", flush=True)
+        return self.sockaddr is not None
+
+class DelayScheduler:
+    """Releases each delayed send at its own due time from one background thread.
+
+    Replaces sleeping per target in the send loop: a fan-out of N delayed packets
+    is N heap pushes, and the caller goes straight back to receiving.
+    """
+
+    def __init__(self):
+        self.heap = []  # (due, seq, fn, args); seq keeps equal due times FIFO
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def call_later(self, delay, fn, *args):
+        with self.cond:
+            heapq.heappush(self.heap, (time.monotonic() + delay, next(self.seq), fn, args))
+            self.cond.notify()
+
+    def pending(self):
+        return len(self.heap)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.heap:
+                    self.cond.wait()
+                wait = self.heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self.cond.wait(wait)  # woken early if something sooner is pushed
+                    continue
+                _, _, fn, args = heapq.heappop(self.heap)
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[{NODE_NAME}] Forward error: {e}", flush=True)
+
+SCHEDULER = DelayScheduler()
+
+def time_on_air(size, sf=LORA_SF, bw=LORA_BW, cr=LORA_CR, preamble=LORA_PREAMBLE):
+    """Seconds on air for a size-byte LoRa payload (Semtech AN1200.13: explicit header, CRC on)."""
+    t_sym = 2 ** sf / bw
+    de = 1 if t_sym > 0.016 else 0  # low data rate optimisation, required above 16 ms symbols
+    symbols = 8 + max(math.ceil((8 * size - 4 * sf + 44) / (4 * (sf - 2 * de))) * (cr + 4), 0)
+    return (preamble + 4.25 + symbols) * t_sym
+
+class AirtimeAccountant:
+    """Duty-cycle budget for the node's radio.
+
+    Every transmission is charged its time on air. With DUTY_CYCLE > 0, at most
+    DUTY_CYCLE * DUTY_WINDOW seconds may be on air in any sliding window, and
+    the radio sends one datagram at a time. reserve() books each datagram at
+    the earliest time both allow and returns how long the caller must wait.
+    Bookings are made in call order, so deferred datagrams keep their order.
+    ACKs are booked with queue=False: they go out at once, ahead of datagrams
+    waiting for the radio, or are dropped if the budget has no room now.
+    """
+
+    def __init__(self, duty_cycle, window, max_wait):
+        self.budget = duty_cycle * window
+        self.window = window
+        self.max_wait = max_wait  # longest budget wait before dropping; 0 drops as soon as the budget is spent
+        self.booked = deque()  # (start, airtime) in start order
+        self.used = 0.0  # airtime booked in the current window
+        self.busy_until = 0.0
+        self.lock = threading.Lock()
+        self.counters = {"airtime_s": 0.0, "deferred": 0, "dropped": 0, "wait_s": 0.0, "max_wait_s": 0.0}
+
+    def reserve(self, size, queue=True):
+        """Book size bytes on air. Returns the seconds to wait before sending, or None to drop."""
+        airtime = time_on_air(size)
+        now = time.monotonic()
+        with self.lock:
+            if self.budget <= 0:
+                self.counters["airtime_s"] += airtime
+                return 0.0
+            while self.booked and self.booked[0][0] <= now - self.window:
+                self.used -= self.booked.popleft()[1]
+            radio_free = start = max(now, self.busy_until) if queue else now
+            used = self.used
+            for booked_at, booked_airtime in self.booked:
+                if used + airtime <= self.budget:
+                    break
+                start = max(start, booked_at + self.window)  # wait for this booking to leave the window
+                used -= booked_airtime
+            if used + airtime > self.budget or start - radio_free > (self.max_wait if queue else 0.0):
+                self.counters["dropped"] += 1
+                return None
+            bisect.insort(self.booked, (start, airtime))  # an ACK can start before datagrams already queued
+            self.used += airtime
+            self.busy_until = max(self.busy_until, start + airtime)
+            wait = start - now
+            self.counters["airtime_s"] += airtime
+            if wait > 0:
+                self.counters["deferred"] += 1
+                self.counters["wait_s"] += wait
+                self.counters["max_wait_s"] = max(self.counters["max_wait_s"], wait)
+            return wait
+
+    def stats(self):
+        stats = {k: round(v, 3) if isinstance(v, float) else v for k, v in self.counters.items()}
+        if self.budget > 0:
+            stats["window_used"] = round(self.used / self.budget, 3)  # share of the current budget booked
+        return stats
+
+AIRTIME = AirtimeAccountant(DUTY_CYCLE, DUTY_WINDOW, 0.0 if DUTY_POLICY == "drop" else DUTY_MAX_WAIT)
+
+def transmit(sender, data, sockaddr, queue=True):
+    """Put one datagram on the air. Returns the duty-cycle wait in seconds, or None if it was dropped."""
+    wait = AIRTIME.reserve(len(data), queue)
+    if wait is None:
+        print(f"[{NODE_NAME}] Duty cycle: budget spent, dropped {len(data)} bytes to {sockaddr[0]}:{sockaddr[1]}", flush=True)
+        return None
+    if wait > 0:
+        print(f"[{NODE_NAME}] Duty cycle: waiting {wait:.3f}s to send {len(data)} bytes to {sockaddr[0]}:{sockaddr[1]}", flush=True)
+        # SENDERS, not sender: the loop's sender may be an asyncio transport, which the scheduler thread must not use
+        SCHEDULER.call_later(wait, transmit_now, SENDERS, data, sockaddr)
+        return wait
+    transmit_now(sender, data, sockaddr)
+    return 0.0
+
+def transmit_now(sender, data, sockaddr):
+    sender.sendto(data, sockaddr)
+    LINK.count(data)
+
+ACK_BYTES = 17  # largest ACK: marker, varint port and base, 64-bit bitmap
+
+def ack_timeout(size, backoff):
+    """Seconds to wait for the ACK of a size-byte frame: the backoff, plus the
+    frame's and the ACK's time on air while DUTY_CYCLE emulates the radio."""
+    if DUTY_CYCLE <= 0:
+        return backoff
+    return backoff + time_on_air(size) + ACK_DELAY + time_on_air(ACK_BYTES)
+
+RELIABLE_MARK = 0x04  # reliable frame: varint sender port, varint sequence, then the datagram
+ACK_MARK = 0x05  # ACK: varint acker port, varint base sequence, 64-bit bitmap of base..base+63
+
+class LinkLayer:
+    """Per-hop reliability (RELIABLE=true) plus transmit counters for every node.
+
+    Each outgoing datagram gets a per-neighbor sequence number and stays in a
+    bounded buffer until ACKed. It is resent after RETRY_BASE, then twice that,
+    and so on (jittered), and given up after RETRY_MAX retries. With a duty
+    cycle set, each timeout also covers the frame's and the ACK's airtime. Receivers
+    collect sequence numbers per peer for ACK_DELAY and answer with one bitmap
+    ACK. A retransmitted copy is just a duplicate to the dedup cache, so each
+    node still delivers a message once.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.next_seq = {}  # neighbor sockaddr -> next sequence number
+        self.unacked = OrderedDict()  # (sockaddr, seq) -> [frame, retries]
+        self.to_ack = {}  # (peer ip, peer port) -> sequence numbers awaiting an ACK
+        self.lock = threading.Lock()
+        self.counters = {"tx_datagrams": 0, "tx_bytes": 0, "retransmits": 0,
+                         "acks_sent": 0, "acked": 0, "gave_up": 0}
+
+    def count(self, data):
+        self.counters["tx_datagrams"] += 1
+        self.counters["tx_bytes"] += len(data)
+
+    def frame(self, data, sockaddr):
+        """Wrap data for sockaddr and keep it until it is ACKed. The caller schedules the first retry."""
+        with self.lock:
+            seq = self.next_seq.get(sockaddr, 0)
+            self.next_seq[sockaddr] = seq + 1
+            buf = bytearray([RELIABLE_MARK])
+            _put_varint(buf, PORT)
+            _put_varint(buf, seq)
+            buf += data
+            frame = bytes(buf)
+            if len(self.unacked) >= self.capacity:
+                self.unacked.popitem(last=False)
+                self.counters["gave_up"] += 1
+            self.unacked[(sockaddr, seq)] = [frame, 0]
+        return frame, seq
+
+    def retry(self, sockaddr, seq):
+        with self.lock:
+            entry = self.unacked.get((sockaddr, seq))
+            if entry is None:
+                return  # ACKed
+            if entry[1] >= RETRY_MAX:
+                del self.unacked[(sockaddr, seq)]
+                self.counters["gave_up"] += 1
+                return
+            entry[1] += 1
+            self.counters["retransmits"] += 1
+            frame, retries = entry
+        wait = 0.0
+        try:
+            wait = transmit(SENDERS, frame, sockaddr) or 0.0
+        except OSError as e:
+            print(f"[{NODE_NAME}] Retransmit to {sockaddr[0]}:{sockaddr[1]} failed: {e}", flush=True)
+        SCHEDULER.call_later(wait + ack_timeout(len(frame), RETRY_BASE * 2 ** retries * random.uniform(1.0, 1.5)),
+                             self.retry, sockaddr, seq)
+
+    def accept(self, data, addr):
+        """Strip a reliable frame, schedule its ACK, and return the datagram inside."""
+        port, pos = _get_varint(data, 1)
+        seq, pos = _get_varint(data, pos)
+        peer = (addr[0], port)
+        with self.lock:
+            pending = self.to_ack.get(peer)
+            if pending is None:
+                pending = self.to_ack[peer] = set()
+                SCHEDULER.call_later(ACK_DELAY, self.send_acks, peer)
+            pending.add(seq)
+        return data[pos:]
+
+    def send_acks(self, peer):
+        with self.lock:
+            seqs = sorted(self.to_ack.pop(peer, ()))
+        while seqs:
+            base = seqs[0]
+            bits = 0
+            for seq in seqs:
+                if seq - base < 64:
+                    bits |= 1 << (seq - base)
+            seqs = [seq for seq in seqs if seq - base >= 64]
+            buf = bytearray([ACK_MARK])
+            _put_varint(buf, PORT)
+            _put_varint(buf, base)
+            buf += bits.to_bytes(8, "little")
+            transmit(SENDERS, bytes(buf), peer, queue=False)  # the sender's retry timer is running
+            self.counters["acks_sent"] += 1
+
+    def on_ack(self, data, addr):
+        port, pos = _get_varint(data, 1)
+        base, pos = _get_varint(data, pos)
+        bits = int.from_bytes(data[pos:pos + 8], "little")
+        sockaddr = (addr[0], port)
+        with self.lock:
+            for i in range(64):
+                if bits >> i & 1 and self.unacked.pop((sockaddr, base + i), None) is not None:
+                    self.counters["acked"] += 1
+
+    def stats(self):
+        return dict(self.counters, unacked=len(self.unacked))
+
+LINK = LinkLayer(RETRANSMIT_BUFFER)
+
+def send_datagram(sender, data, sockaddr):
+    """Every mesh datagram leaves through here: framed when RELIABLE, then transmitted.
+
+    Returns the duty-cycle wait in seconds, or None if the budget dropped it.
+    """
+    if not RELIABLE:
+        return transmit(sender, data, sockaddr)
+    frame, seq = LINK.frame(data, sockaddr)
+    wait = transmit(sender, frame, sockaddr)
+    # a dropped frame is retried like a lost one
+    SCHEDULER.call_later((wait or 0.0) + ack_timeout(len(frame), RETRY_BASE), LINK.retry, sockaddr, seq)
+    return wait
+
+_SELF_IP = None
+
+def self_ip():
+    """This pod's address, looked up once (POD_IP from the downward API when set)."""
+    global _SELF_IP
+    if _SELF_IP is None:
+        _SELF_IP = os.getenv("POD_IP") or socket.gethostbyname(socket.gethostname())
+    return _SELF_IP
+
+def peer_neighbor(ip):
+    neighbor = Neighbor(ip, PORT)
+    neighbor.sockaddr = (ip, PORT)  # already an address
+    neighbor.stale = False
+    return neighbor
+
+def update_peers(ips):
+    """Swap in a new peer list, keeping the Neighbor objects of peers that are still there."""
+    global KNOWN_PEERS
+    ips = set(ips) - {self_ip()}
+    current = {neighbor.host: neighbor for neighbor in KNOWN_PEERS}
+    if not ips or ips == set(current):
+        return  # an empty answer is more likely a DNS hiccup than an empty mesh
+    neighbors = []
+    for ip in sorted(ips):
+        neighbors.append(current.get(ip) or peer_neighbor(ip))
+    KNOWN_PEERS = neighbors  # one assignment, so senders always see a complete list
+    if PEER_SAMPLING == "views":
+        SAMPLER.membership_changed(ips - set(current), set(current) - ips)
+    print(f"[{NODE_NAME}] Peers: {len(neighbors)} (+{len(ips - set(current))} -{len(set(current) - ips)})", flush=True)
 
 def resolve_peers():
-    global KNOWN_PEERS, last_peer_refresh
+    """Look up every pod behind the headless service in-process."""
     try:
-        output = subprocess.check_output(["getent", "hosts", SERVICE_NAME], stderr=subprocess.DEVNULL).decode()
-        lines = output.strip().split("\n")
-        peers = list({line.split()[0] for line in lines if line.split()[0] != socket.gethostbyname(socket.gethostname())})
-        if peers:
-            KNOWN_PEERS = peers
-            last_peer_refresh = time.time()
-    except Exception as e:
+        infos = socket.getaddrinfo(SERVICE_NAME, PORT, socket.AF_INET, socket.SOCK_DGRAM)
+    except OSError as e:
         print(f"[{NODE_NAME}] DNS resolution failed: {e}", flush=True)
+        return
+    update_peers(info[4][0] for info in infos)
+
+def read_peers_file():
+    """Addresses from PEERS_FILE: one per line, or JSON.
+
+    The JSON may be an EndpointSlice, a list of them (bare or as a List's
+    "items"), or a list of addresses. Anything else raises ValueError.
+    """
+    with open(PEERS_FILE) as f:
+        text = f.read()
+    try:
+        doc = json.loads(text)
+    except ValueError:
+        return [line.split()[0] for line in text.splitlines() if line.strip() and not line.startswith("#")]
+    items = doc.get("items", [doc]) if isinstance(doc, dict) else doc
+    if not isinstance(items, list):
+        raise ValueError(f"expected EndpointSlice JSON or a list of addresses, not a JSON {type(items).__name__}")
+    ips = []
+    for item in items:
+        if isinstance(item, str):
+            ips.append(item)  # a plain address list
+        elif isinstance(item, dict):
+            for endpoint in item.get("endpoints") or []:
+                if (endpoint.get("conditions") or {}).get("ready", True):
+                    ips.extend(endpoint.get("addresses", []))
+        else:
+            raise ValueError(f"expected EndpointSlices or addresses in the list, not a JSON {type(item).__name__}")
+    return ips
+
+def discover_peers_periodically():
+    """Keeps KNOWN_PEERS current off the receive path.
+
+    With PEERS_FILE set, the file is the source of truth and is reloaded whenever
+    its mtime changes. Otherwise DNS is re-resolved every PEER_REFRESH_INTERVAL,
+    jittered so a freshly scaled deployment doesn't refresh in lockstep. Until a
+    lookup has found a peer, it is retried every PEER_RETRY_INTERVAL instead, so a
+    pod that starts before the others does not sit idle for a whole refresh.
+    """
+    mtime = None
+    while True:
+        if PEERS_FILE:
+            try:
+                changed = os.stat(PEERS_FILE).st_mtime_ns
+                if changed != mtime:
+                    mtime = changed
+                    update_peers(read_peers_file())
+            except (OSError, ValueError) as e:
+                print(f"[{NODE_NAME}] Could not read {PEERS_FILE}: {e}", flush=True)  # once per change of the file
+            time.sleep(PEERS_FILE_POLL)
+        else:
+            if KNOWN_PEERS:  # update_peers never empties the list, so this means a lookup has succeeded
+                time.sleep(PEER_REFRESH_INTERVAL * random.uniform(1 - PEER_REFRESH_JITTER, 1 + PEER_REFRESH_JITTER))
+            else:
+                time.sleep(PEER_RETRY_INTERVAL)
+            resolve_peers()
+
+CONTROL_MARK = 0x03  # first byte of a peer-sampling control datagram (JSON follows)
+
+def send_control(ip, msg):
+    try:
+        SENDERS.sendto(bytes([CONTROL_MARK]) + json.dumps(msg).encode(), (ip, PORT))
+    except OSError as e:
+        print(f"[{NODE_NAME}] Control send to {ip} failed: {e}", flush=True)
+
+class PeerSampler:
+    """HyParView/Cyclon-style partial views over the discovered pods.
+
+    The active view (at most ACTIVE_VIEW peers) is the forwarding set. Links in
+    it are symmetric: a ping with "active" set doubles as a neighbor request,
+    and a peer that cannot take the link answers "disconnect". Active peers
+    are the lowest-RTT ones that keep answering, and a swap needs a
+    VIEW_SWITCH_MARGIN RTT win so the overlay stays stable. The passive view
+    is a pool of backups, seeded from DNS discovery and kept mixed by Cyclon
+    shuffles with active peers.
+    """
+
+    def __init__(self, active_size, passive_size, shuffle_length):
+        self.active_size = active_size
+        self.passive_size = passive_size
+        self.shuffle_length = shuffle_length
+        self.active = []  # ips
+        self.passive = []  # ips
+        self.rtt = {}  # ip -> smoothed RTT in seconds
+        self.misses = {}  # ip -> pings in a row without a pong
+        self.outstanding = set()  # ips pinged in the current round
+        self.peers = {}  # ip -> Neighbor
+        self.outbox = []  # control messages decided under the lock, sent after it
+        self.lock = threading.Lock()
+
+    def neighbor(self, ip):
+        peer = self.peers.get(ip)
+        if peer is None:
+            peer = self.peers[ip] = peer_neighbor(ip)
+        return peer
+
+    def active_neighbors(self):
+        with self.lock:
+            return [self.neighbor(ip) for ip in self.active]
+
+    def _add_passive(self, ips):
+        me = self_ip()
+        for ip in ips:
+            if ip == me or ip in self.active or ip in self.passive:
+                continue
+            if len(self.passive) >= self.passive_size:
+                self.passive.pop(random.randrange(len(self.passive)))
+            self.passive.append(ip)
 
-def refresh_peers_if_needed():
-    if time.time() - last_peer_refresh > PEER_REFRESH_INTERVAL:
-        resolve_peers()
+    def _forget(self, ip):
+        for view in (self.active, self.passive):
+            if ip in view:
+                view.remove(ip)
+        self.rtt.pop(ip, None)
+        self.misses.pop(ip, None)
+        self.peers.pop(ip, None)
+
+    def _promote(self, ip):
+        if ip in self.passive:
+            self.passive.remove(ip)
+        self.active.append(ip)
+
+    def _demote(self, ip, notify):
+        self.active.remove(ip)
+        self._add_passive([ip])
+        if notify:
+            self.outbox.append((ip, {"op": "disconnect"}))
+
+    def _select(self):
+        """Fill the active view, fastest measured peers first; swap the slowest active peer only for a clearly faster one."""
+        measured = sorted((self.rtt[ip], ip) for ip in self.passive if ip in self.rtt)
+        while measured and len(self.active) < self.active_size:
+            self._promote(measured.pop(0)[1])
+        unmeasured = [ip for ip in self.passive if ip not in self.rtt]
+        random.shuffle(unmeasured)
+        while unmeasured and len(self.active) < self.active_size:
+            self._promote(unmeasured.pop())  # bootstrap; measured peers will displace it
+        if measured and self.active:
+            worst = max(self.active, key=lambda ip: self.rtt.get(ip, float("inf")))
+            best_rtt, best = measured[0]
+            if best_rtt < self.rtt.get(worst, float("inf")) * (1 - VIEW_SWITCH_MARGIN):
+                self._demote(worst, notify=True)
+                self._promote(best)
+
+    def _sample(self):
+        pool = self.active + self.passive
+        return [self_ip()] + random.sample(pool, min(len(pool), self.shuffle_length - 1))
+
+    def _flush(self):
+        with self.lock:
+            outbox, self.outbox = self.outbox, []
+        for ip, msg in outbox:
+            send_control(ip, msg)
+
+    def membership_changed(self, added, removed):
+        with self.lock:
+            for ip in removed:
+                self._forget(ip)
+            self._add_passive(added)
+
+    def tick(self):
+        """One maintenance round: expire silent peers, reselect, ping, and shuffle with one active peer."""
+        with self.lock:
+            for ip in self.outstanding:
+                self.misses[ip] = self.misses.get(ip, 0) + 1
+                if self.misses[ip] >= 3:
+                    print(f"[{NODE_NAME}] Peer {ip} stopped answering; dropping it from the views", flush=True)
+                    self._forget(ip)
+            if len(self.passive) < self.shuffle_length:
+                known = [neighbor.host for neighbor in KNOWN_PEERS]
+                self._add_passive(random.sample(known, min(len(known), self.passive_size)))
+            self._select()
+            probes = random.sample(self.passive, min(2, len(self.passive)))
+            self.outstanding = set(self.active) | set(probes)
+            priority = len(self.active) <= 1  # HyParView: a nearly isolated node may evict
+            now = time.monotonic()
+            for ip in self.outstanding:
+                active = ip in self.active
+                self.outbox.append((ip, {"op": "ping", "t": now, "active": active, "priority": active and priority}))
+            if self.active:
+                self.outbox.append((random.choice(self.active), {"op": "shuffle", "peers": self._sample()}))
+        self._flush()
+
+    def on_control(self, msg, ip):
+        op = msg.get("op")
+        with self.lock:
+            if op == "ping":
+                self.outbox.append((ip, {"op": "pong", "t": msg["t"]}))
+                if not msg.get("active"):
+                    if ip in self.active:
+                        self._demote(ip, notify=False)  # the peer no longer counts us as a neighbor
+                    else:
+                        self._add_passive([ip])
+                elif ip not in self.active:
+                    if len(self.active) >= self.active_size and msg.get("priority"):
+                        self._demote(random.choice(self.active), notify=True)
+                    if len(self.active) < self.active_size:
+                        self._promote(ip)
+                    else:
+                        self._add_passive([ip])
+                        self.outbox.append((ip, {"op": "disconnect"}))
+            elif op == "pong":
+                sample = time.monotonic() - msg["t"]
+                self.rtt[ip] = sample if ip not in self.rtt else 0.8 * self.rtt[ip] + 0.2 * sample
+                self.misses[ip] = 0
+                self.outstanding.discard(ip)
+            elif op == "disconnect":
+                if ip in self.active:
+                    self._demote(ip, notify=False)
+            elif op == "shuffle":
+                self.outbox.append((ip, {"op": "shuffle_reply", "peers": self._sample()}))
+                self._add_passive(msg.get("peers", []))
+            elif op == "shuffle_reply":
+                self._add_passive(msg.get("peers", []))
+        self._flush()
+
+    def stats(self):
+        with self.lock:
+            rtts = [self.rtt[ip] for ip in self.active if ip in self.rtt]
+            return {"active": len(self.active), "passive": len(self.passive),
+                    "active_rtt_ms": round(sum(rtts) / len(rtts) * 1000, 2) if rtts else None}
+
+SAMPLER = PeerSampler(ACTIVE_VIEW, PASSIVE_VIEW, SHUFFLE_LENGTH)
+
+def sample_peers_periodically():
+    while True:
+        try:
+            SAMPLER.tick()
+        except Exception as e:
+            print(f"[{NODE_NAME}] Peer sampling error: {e}", flush=True)
+        time.sleep(VIEW_TICK)
+
+def handle_control(data, addr):
+    if PEER_SAMPLING == "views":
+        SAMPLER.on_control(json.loads(data[1:].decode()), addr[0])
+
+class DecisionLog:
+    """Random decisions and sensor readings, drawn once per (node, kind, key) and optionally recorded or replayed.
+
+    Keys are message ids (or "" for a node's sequence of readings), not call order,
+    so a replay takes the same decisions although threads and datagrams interleave
+    differently. Replayed values are used once each, in recorded order; a key with
+    nothing left is drawn fresh. Timing jitter is seeded but not recorded.
+    """
+
+    def __init__(self, record_path, replay_paths):
+        self.lock = threading.Lock()
+        self.tape = {}  # (node, kind, key) -> deque of recorded values
+        self.replayed = self.drawn = 0
+        for path in filter(None, replay_paths.split(",")):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut off at shutdown
+                    self.tape.setdefault((entry["node"], entry["kind"], entry["key"]), deque()).append(entry["value"])
+        self.record_path = record_path
+        self.out = open(record_path, "a") if record_path else None
+
+    def decide(self, kind, key, draw):
+        if self.out is None and not self.tape:
+            return draw()
+        with self.lock:
+            value = draw()  # drawn even when replayed, so a seeded sequence stays in step with the recording
+            values = self.tape.get((NODE_NAME, kind, key))
+            if values:
+                self.replayed += 1
+                value = values.popleft()
+            else:
+                self.drawn += 1
+            if self.out is not None:
+                self.out.write(json.dumps({"node": NODE_NAME, "kind": kind, "key": key, "value": value}) + "\n")
+        return value
+
+    def reopen(self, worker_id):
+        """Receive workers record to RANDOM_RECORD.<worker id>, so processes never share a file."""
+        if self.out is not None:
+            self.out = open(f"{self.record_path}.{worker_id}", "a")
+
+    def stats(self):
+        return {"replayed": self.replayed, "drawn": self.drawn, "unused": sum(len(values) for values in self.tape.values())}
+
+    def close(self):
+        with self.lock:
+            if self.out is not None:
+                self.out.close()
+                self.out = None
+
+DECISIONS = DecisionLog(RANDOM_RECORD, RANDOM_REPLAY)
+
+def seed_random(worker_id=0):
+    """With SEED set, every node and receive worker draws its own repeatable sequence."""
+    if SEED:
+        random.seed(f"{SEED}:{NODE_NAME}:{worker_id}")
+
+def new_reading():
+    """A message id and sensor values. Only the values are seeded: a restarted node must not
+    repeat ids its peers still hold in their dedup caches (a replay takes ids from the tape)."""
+    msg_id = str(uuid.uuid4())
+    return {"id": msg_id, "payload": {
+        "temperature": round(random.uniform(20.0, 30.0), 2),
+        "humidity": round(random.uniform(40.0, 60.0), 2)
+    }}
+
+def random_peers(msg_id, peers, count):
+    """Up to count random peers (2-4 when count is 0). The choice is recorded and replayed per message.
+
+    Peers are recorded by pod IP only: every pod listens on the same PORT, and
+    a replay may run on other ports.
+    """
+    def draw():
+        picked = peers[:]
+        random.shuffle(picked)
+        return [neighbor.host for neighbor in picked[:count or random.randint(2, 4)]]
+    chosen = DECISIONS.decide("peers", msg_id, draw)
+    return [neighbor for neighbor in peers if neighbor.host in chosen]
 
 def simulate_packet_loss():
-    return random.random() < PACKET_DROP_RATE
+    return DECISIONS.decide("skip", "", lambda: random.random() < PACKET_DROP_RATE)
 
 def send_sensor_data_periodically():
     if not START_NODE:
         return
     time.sleep(3)
-    resolve_peers()
 
     while True:
-        refresh_peers_if_needed()
-
         if simulate_packet_loss():
             print(f"[{NODE_NAME}] Simulating packet loss (not sending this cycle)", flush=True)
             time.sleep(1)
             continue
 
-        msg_id = str(uuid.uuid4())
-        sensor_data = {
-            "temperature": round(random.uniform(20.0, 30.0), 2),
-            "humidity": round(random.uniform(40.0, 60.0), 2)
-        }
+        reading = DECISIONS.decide("reading", "", new_reading)
+        msg_id = reading["id"]
+        sensor_data = reading["payload"]
 
         msg = {
             "id": msg_id,
             "src": NODE_NAME,
             "payload": sensor_data,
             "hop": 1,
-            "ttl": 25,
+            "ttl": MSG_TTL,
             "ts": time.time()
         }
+        if HOLDER_TRACKING == "path":
+            msg["via"] = [PATH_ID]
+        if ANTI_ENTROPY_INTERVAL > 0:
+            ANTI_ENTROPY.remember(msg)
+        data = encode_message(msg)
 
-        targets = KNOWN_PEERS[:]
-        random.shuffle(targets)
-        for ip in targets[:random.randint(2, 4)]:
+        targets = SAMPLER.active_neighbors() if PEER_SAMPLING == "views" else []
+        if not targets:
+            targets = random_peers(msg_id, KNOWN_PEERS, 0)
+        for neighbor in targets:
             try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                sock.sendto(json.dumps(msg).encode(), (ip, PORT))
-                print(f"[{NODE_NAME}]Sent to {ip}:{PORT}", flush=True)
+                if send_datagram(SENDERS, data, neighbor.sockaddr) is None:
+                    continue  # transmit() has logged the drop
+                print(f"[{NODE_NAME}]Sent to {neighbor.host}:{neighbor.port}", flush=True)
             except Exception as e:
                 print(f"[{NODE_NAME}]Send error: {e}", flush=True)
 
         time.sleep(1)
 
-def listen_and_forward():
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+def receive_message(msg, addr):
+    """Dedupe and log one decoded message. Returns the message to forward, or None."""
+    msg_id = msg.get("id")
+
+    if HOLDER_TRACKING == "seen":
+        HOLDERS.add(msg_id, addr[0])
+    if RECEIVED_IDS.seen(msg_id):
+        if FORWARD_STRATEGY == "counter":
+            COPIES.again(msg_id)
+        return None
+
+    msg["hop"] += 1
+    msg["ttl"] -= 1
+    if HOLDER_TRACKING == "path":
+        msg["via"] = (msg.get("via", []) + [PATH_ID])[-PATH_MAX:]
+    if ANTI_ENTROPY_INTERVAL > 0:
+        ANTI_ENTROPY.remember(msg)
+
+    print(f"[{NODE_NAME}] Received: {msg}", flush=True)
+
+    log_entry = {
+        "node": NODE_NAME,
+        "from": addr[0],
+        "msg_id": msg["id"],
+        "hop": msg["hop"],
+        "ttl": msg["ttl"],
+        "payload": msg["payload"],
+        "timestamp": time.time()
+    }
+
+    EVENT_LOG.log(log_entry)
+    if GATEWAY:
+        GATEWAY_STORE.add(msg, addr)
+
+    if msg["ttl"] <= 0:
+        print(f"[{NODE_NAME}] 🧯 TTL expired. Not forwarding.", flush=True)
+        return None
+
+    return msg
+
+class HolderTable:
+    """Addresses each recent message id arrived from, so forwards can skip peers that already have it."""
+
+    def __init__(self, max_entries=4096):
+        self.holders = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+    def add(self, msg_id, ip):
+        with self.lock:
+            holders = self.holders.get(msg_id)
+            if holders is None:
+                holders = self.holders[msg_id] = set()
+                if len(self.holders) > self.max_entries:
+                    self.holders.popitem(last=False)
+            holders.add(ip)
+
+    def get(self, msg_id):
+        with self.lock:
+            return set(self.holders.get(msg_id, ()))
+
+HOLDERS = HolderTable()
+
+def known_holders(msg):
+    """Peers known to have msg already: node ids it carries (path) or addresses it came from (seen)."""
+    if HOLDER_TRACKING == "path":
+        return set(msg.get("via", ()))
+    if HOLDER_TRACKING == "seen":
+        return HOLDERS.get(msg["id"])
+    return set()
+
+def forward_targets(msg, addr):
+    """The active view (PEER_SAMPLING=views) or 2-4 random peers, never back to the sender or to a known holder."""
+    holders = known_holders(msg)
+    active = SAMPLER.active_neighbors() if PEER_SAMPLING == "views" else []
+    peers = [neighbor for neighbor in active or KNOWN_PEERS if neighbor.host != addr[0]]
+    targets = [neighbor for neighbor in peers if neighbor.host not in holders]
+    FORWARD_STATS["skipped"] += len(peers) - len(targets)
+    if active:
+        return targets
+    return random_peers(msg["id"], targets, FANOUT)
+
+def prepare_forward(msg, addr):
+    """Encode the message once for the whole fan-out (this version does not log forwards)."""
+    return encode_message(msg), None
+
+def forward_to(sender, data, neighbor, record):
+    """Send one datagram to neighbor. Returns the duty-cycle wait, or None if the budget dropped it."""
+    # sender is anything with sendto(): a socket or an asyncio transport
+    try:
+        wait = send_datagram(sender, data, neighbor.sockaddr)
+    except OSError:
+        neighbor.stale = True  # the peer may have a new address; re-resolve it
+        raise
+    if wait is None:
+        return None  # transmit() has logged the drop
+    print(f"[{NODE_NAME}] Forwarded to {neighbor.host}:{neighbor.port}", flush=True)
+    return wait
+
+class Coalescer:
+    """Holds relayed datagrams per neighbor for up to AGGREGATE_WINDOW and sends them as one bundle."""
+
+    def __init__(self, window, max_bytes):
+        self.window = window
+        self.max_bytes = max_bytes
+        self.pending = {}  # sockaddr -> [neighbor, [(data, record)], bundle size]
+        self.lock = threading.Lock()
+        self.datagrams = 0
+        self.messages = 0
+        self.dropped = 0  # messages in bundles the duty-cycle budget dropped
+
+    def add(self, data, neighbor, record):
+        key = neighbor.sockaddr
+        full = None
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is not None and entry[2] + len(data) + 2 > self.max_bytes:
+                full = self.pending.pop(key)
+                entry = None
+            if entry is None:
+                entry = self.pending[key] = [neighbor, [], 1]
+                SCHEDULER.call_later(self.window, self.flush, key, entry)
+            entry[1].append((data, record))
+            entry[2] += len(data) + 2
+        if full is not None:
+            self.send(full[0], full[1])
+
+    def flush(self, key, entry):
+        """Send entry when its window closes, unless it already went out full."""
+        with self.lock:
+            if self.pending.get(key) is not entry:
+                return
+            del self.pending[key]
+        self.send(entry[0], entry[1])
+
+    def send(self, neighbor, parts):
+        data = parts[0][0] if len(parts) == 1 else bundle([part for part, _ in parts])
+        try:
+            wait = forward_to(SENDERS, data, neighbor, None)
+        except Exception as e:
+            print(f"[{NODE_NAME}] Forward error: {e}", flush=True)
+            return
+        if wait is None:
+            self.dropped += len(parts)
+            print(f"[{NODE_NAME}] Duty cycle: dropped {len(parts)} messages for {neighbor.host}:{neighbor.port}", flush=True)
+            return
+        self.datagrams += 1
+        self.messages += len(parts)
+        for _, record in parts:
+            if record is not None:
+                EVENT_LOG.log(dict(record, timestamp=time.time() + wait))
+
+    def stats(self):
+        return {"datagrams": self.datagrams, "messages": self.messages, "dropped": self.dropped}
+
+COALESCER = Coalescer(AGGREGATE_WINDOW, BUNDLE_MAX_BYTES)
+
+def send_forward(data, neighbor, record):
     try:
-        sock.bind(("", PORT))
-        print(f"[{NODE_NAME}] Listening on port {PORT}...", flush=True)
+        forward_to(SENDERS, data, neighbor, record)
     except Exception as e:
-        print(f"[{NODE_NAME}] Port bind failed: {e}", flush=True)
+        print(f"[{NODE_NAME}] Forward error: {e}", flush=True)
+
+class CopyCounter:
+    """Copies heard per message id while a counter-strategy rebroadcast is on hold."""
+
+    def __init__(self, max_entries=4096):
+        self.counts = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+    def first(self, msg_id):
+        with self.lock:
+            self.counts[msg_id] = 1
+            if len(self.counts) > self.max_entries:
+                self.counts.popitem(last=False)
+
+    def again(self, msg_id):
+        with self.lock:
+            if msg_id in self.counts:
+                self.counts[msg_id] += 1
+
+    def pop(self, msg_id):
+        with self.lock:
+            return self.counts.pop(msg_id, 0)
+
+COPIES = CopyCounter()
+FORWARD_STATS = {"relayed": 0, "suppressed": 0, "skipped": 0}
+
+def forward_hold(msg):
+    """FORWARD_STRATEGY for a first-seen message: seconds to hold it before relaying, or None to drop it."""
+    if FORWARD_STRATEGY == "gossip":
+        if msg["hop"] <= GOSSIP_MIN_HOPS or DECISIONS.decide("relay", msg["id"], lambda: random.random() < GOSSIP_PROB):
+            return 0.0
+        return None
+    if FORWARD_STRATEGY == "hop":
+        prob = max(HOP_MIN_PROB, 1.0 - HOP_DECAY * (msg["hop"] - 1))
+        if DECISIONS.decide("relay", msg["id"], lambda: random.random() < prob):
+            return 0.0
+        return None
+    if FORWARD_STRATEGY == "counter":
+        COPIES.first(msg["id"])
+        # random so neighbours that heard the same copy don't all fire at once
+        return DECISIONS.decide("wait", msg["id"], lambda: random.uniform(0, COUNTER_WINDOW))
+    return 0.0
+
+def fan_out(msg, addr, send):
+    """Apply the forwarding strategy, then hand each (data, neighbor, record) to the loop's send()."""
+    hold = forward_hold(msg)
+    if hold is None:
+        FORWARD_STATS["suppressed"] += 1
+        print(f"[{NODE_NAME}] {FORWARD_STRATEGY} strategy: not forwarding {msg['id']}", flush=True)
+    elif hold:
+        SCHEDULER.call_later(hold, release_held, msg, addr)
+    else:
+        relay(msg, addr, send)
+
+def relay(msg, addr, send):
+    if AGGREGATE_WINDOW > 0:
+        send = COALESCER.add
+    FORWARD_STATS["relayed"] += 1
+    data, record = prepare_forward(msg, addr)
+    for neighbor in forward_targets(msg, addr):
+        send(data, neighbor, record)
+
+def release_held(msg, addr):
+    """Counter strategy: rebroadcast only if fewer than COUNTER_THRESHOLD copies arrived during the hold."""
+    copies = COPIES.pop(msg["id"])
+    if copies >= COUNTER_THRESHOLD:
+        FORWARD_STATS["suppressed"] += 1
+        print(f"[{NODE_NAME}] Heard {copies} copies of {msg['id']}. Not forwarding.", flush=True)
         return
+    relay(msg, addr, send_forward)
+
+def handle_datagram(data, addr, send):
+    """Receive every message in a datagram (a bundle carries several) and fan each one out."""
+    for part in unbundle(data):
+        handle_message(decode_message(part), addr, send)
+
+def handle_message(msg, addr, send):
+    msg = receive_message(msg, addr)
+    if msg is not None and (not GATEWAY or GATEWAY_RELAY):
+        fan_out(msg, addr, send)
+
+class IngressQueue:
+    """Bounded two-class queue between the socket and the forwarding path.
 
-    resolve_peers()
+    Each source address gets a token bucket (INGRESS_RATE/s, INGRESS_BURST deep).
+    Fresh readings (hop <= INGRESS_FRESH_HOPS) are served before high-hop relays,
+    and a full queue evicts the oldest relay to admit a fresh reading. Every drop
+    is counted, so overload shows up in the stats line instead of as silent loss.
+    """
 
+    def __init__(self, capacity, rate, burst):
+        self.capacity = capacity
+        self.rate = rate
+        self.burst = burst
+        self.queues = (deque(), deque())  # 0: fresh readings, 1: relays
+        self.buckets = {}  # source ip -> (tokens, last refill)
+        self.cond = threading.Condition()
+        self.accepted = 0
+        self.drops = {"oversized": 0, "rate_limited": 0, "queue_full": 0, "evicted": 0, "lost": 0}
+
+    def _admit(self, ip, now):
+        tokens, last = self.buckets.get(ip, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self.buckets[ip] = (tokens, now)
+            return False
+        self.buckets[ip] = (tokens - 1, now)
+        return True
+
+    def offer(self, data, addr):
+        msgs = [decode_message(part) for part in unbundle(data)]
+        with self.cond:
+            if not self._admit(addr[0], time.monotonic()):
+                self.drops["rate_limited"] += len(msgs)
+                return
+            for msg in msgs:
+                priority = 0 if msg.get("hop", 0) < INGRESS_FRESH_HOPS else 1  # hop is bumped on receipt
+                if len(self.queues[0]) + len(self.queues[1]) >= self.capacity:
+                    if priority == 0 and self.queues[1]:
+                        self.queues[1].popleft()
+                        self.drops["evicted"] += 1
+                    else:
+                        self.drops["queue_full"] += 1
+                        continue
+                self.queues[priority].append((msg, addr))
+                self.accepted += 1
+            self.cond.notify()
+
+    def take(self):
+        with self.cond:
+            while not (self.queues[0] or self.queues[1]):
+                self.cond.wait()
+            return (self.queues[0] or self.queues[1]).popleft()
+
+    def stats(self):
+        return dict(self.drops, accepted=self.accepted, queued=len(self.queues[0]) + len(self.queues[1]))
+
+INGRESS = IngressQueue(INGRESS_QUEUE, INGRESS_RATE, INGRESS_BURST)
+
+def loss_key(data):
+    """Decision-tape key for a datagram's LOSS_RATE draw that is the same on every run.
+
+    Message datagrams use their first message's id and hop, so a retransmitted
+    frame repeats its key. Control frames carry ports and timing, so they are
+    keyed by their frame type.
+    """
+    if data[:1] == bytes([RELIABLE_MARK]):
+        _, pos = _get_varint(data, 1)
+        _, pos = _get_varint(data, pos)
+        data = data[pos:]
+    if data[:1] == bytes([REPAIR_MARK]):
+        data = data[1:]
+    if not data or data[0] in (ACK_MARK, DIGEST_MARK, CONTROL_MARK):
+        return f"frame:{data[:1].hex()}"
+    msg = decode_message(unbundle(data)[0])
+    return f"{msg.get('id')}:{msg.get('hop')}"
+
+def ingest(data, addr, send):
+    """Entry point for every received datagram: handled inline, or queued when INGRESS_QUEUE is set."""
+    # emulated link loss, decided before the link layer sees the datagram so a lost frame is never ACKed
+    if LOSS_RATE > 0 and DECISIONS.decide("loss", loss_key(data), lambda: random.random() < LOSS_RATE):
+        INGRESS.drops["lost"] += 1
+        return
+    if data[:1] == bytes([ACK_MARK]):
+        LINK.on_ack(data, addr)
+        return
+    if data[:1] == bytes([RELIABLE_MARK]):
+        data = LINK.accept(data, addr)  # ACKed even if it turns out to be a duplicate
+    if data[:1] == bytes([DIGEST_MARK]):
+        ANTI_ENTROPY.on_digest(data, addr)
+        return
+    if data[:1] == bytes([REPAIR_MARK]):
+        ANTI_ENTROPY.on_repair(data, addr)
+        return
+    if data[:1] == bytes([CONTROL_MARK]):
+        handle_control(data, addr)  # peer-sampling traffic is tiny and never queued
+    elif len(data) > MAX_DATAGRAM:
+        INGRESS.drops["oversized"] += 1
+        print(f"[{NODE_NAME}] Dropped oversized datagram ({len(data)} bytes) from {addr[0]}", flush=True)
+    elif INGRESS_QUEUE > 0:
+        INGRESS.offer(data, addr)
+    else:
+        handle_datagram(data, addr, send)
+
+def process_ingress():
+    """Ingress worker: forwards queued messages, fresh readings first."""
     while True:
-        refresh_peers_if_needed()
+        msg, addr = INGRESS.take()
+        try:
+            handle_message(msg, addr, send_forward)
+        except Exception as e:
+            print(f"[{NODE_NAME}] Error in loop: {e}", flush=True)
+
+
+DIGEST_MARK = 0x06  # anti-entropy digest: varint sender port, then a Bloom filter of recent ids
+REPAIR_MARK = 0x07  # anti-entropy repair: a bundle of messages the digest was missing
+# Digest and repair frames must fit one LoRa payload while DUTY_CYCLE emulates the radio;
+# a digest's mark and varint port take 4 bytes of it.
+DIGEST_BITS = 8 * (LORA_FRAME_ROOM - 4) if DUTY_CYCLE > 0 else 4096  # 512 bytes: about 0.2% false positives at ANTI_ENTROPY_KEEP=256
+REPAIR_MAX_BYTES = LORA_FRAME_ROOM if DUTY_CYCLE > 0 else MAX_DATAGRAM
+DIGEST_HASHES = 4
 
+def _digest_positions(msg_id, nbits=DIGEST_BITS):
+    digest = hashlib.blake2b(str(msg_id).encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % nbits for i in range(DIGEST_HASHES)]
+
+class AntiEntropy:
+    """Digest exchange that repairs messages a node missed.
+
+    Every ANTI_ENTROPY_INTERVAL (jittered) a node sends one neighbor a Bloom
+    digest of the ids it saw in the last ANTI_ENTROPY_WINDOW seconds. The
+    neighbor answers with up to ANTI_ENTROPY_MAX of its own recent messages
+    that are not in the digest. Repaired messages are delivered and logged like
+    any other, but not flooded again: each node repairs itself.
+    """
+
+    def __init__(self, window, keep):
+        self.window = window
+        self.keep = keep
+        self.recent = OrderedDict()  # msg id -> (monotonic time seen, msg)
+        self.lock = threading.Lock()
+        self.counters = {"digests_sent": 0, "repairs_sent": 0, "repaired": 0}
+
+    def remember(self, msg):
+        now = time.monotonic()
+        with self.lock:
+            self.recent[msg["id"]] = (now, msg)
+            while self.recent and (len(self.recent) > self.keep or next(iter(self.recent.values()))[0] < now - self.window):
+                self.recent.popitem(last=False)
+
+    def _live(self):
+        cutoff = time.monotonic() - self.window
+        with self.lock:
+            return [msg for seen_at, msg in self.recent.values() if seen_at >= cutoff]
+
+    def send_digest(self, neighbor):
+        bits = bytearray(DIGEST_BITS // 8)
+        for msg in self._live():
+            for p in _digest_positions(msg["id"]):
+                bits[p >> 3] |= 1 << (p & 7)
+        frame = bytearray([DIGEST_MARK])
+        _put_varint(frame, PORT)
+        frame += bits
+        send_datagram(SENDERS, bytes(frame), neighbor.sockaddr)
+        self.counters["digests_sent"] += 1
+
+    def on_digest(self, data, addr):
+        port, pos = _get_varint(data, 1)
+        bits = data[pos:]  # sized by the sender, whose DUTY_CYCLE may differ from ours
+        if not bits:
+            return
+        missing = [msg for msg in self._live()
+                   if not all(bits[p >> 3] & (1 << (p & 7)) for p in _digest_positions(msg["id"], 8 * len(bits)))]
+        parts, size = [], 2
+        for msg in missing[-ANTI_ENTROPY_MAX:]:  # newest first to go if over the cap
+            part = encode_message(msg)
+            if parts and size + len(part) + 2 > REPAIR_MAX_BYTES:
+                self._send_repair(parts, (addr[0], port))
+                parts, size = [], 2
+            parts.append(part)
+            size += len(part) + 2
+        if parts:
+            self._send_repair(parts, (addr[0], port))
+
+    def _send_repair(self, parts, sockaddr):
+        send_datagram(SENDERS, bytes([REPAIR_MARK]) + bundle(parts), sockaddr)
+        self.counters["repairs_sent"] += len(parts)
+
+    def on_repair(self, data, addr):
+        for part in unbundle(data[1:]):
+            if receive_message(decode_message(part), addr) is not None:
+                self.counters["repaired"] += 1
+
+    def stats(self):
+        return dict(self.counters, recent=len(self.recent))
+
+ANTI_ENTROPY = AntiEntropy(ANTI_ENTROPY_WINDOW, ANTI_ENTROPY_KEEP)
+
+def anti_entropy_periodically():
+    while True:
+        time.sleep(ANTI_ENTROPY_INTERVAL * random.uniform(0.5, 1.5))
+        peers = (SAMPLER.active_neighbors() if PEER_SAMPLING == "views" else []) or KNOWN_PEERS
+        if not peers:
+            continue
         try:
-            data, addr = sock.recvfrom(2048)
-            msg = json.loads(data.decode())
-            msg_id = msg.get("id")
+            ANTI_ENTROPY.send_digest(random.choice(peers))
+        except Exception as e:
+            print(f"[{NODE_NAME}] Anti-entropy error: {e}", flush=True)
 
-            if msg_id in RECEIVED_IDS:
-                continue
+def listen_and_forward():
+    try:
+        sock = bind_listen_socket()
+        print(f"[{NODE_NAME}] Listening on port {PORT} (worker {WORKER_ID})...", flush=True)
+    except Exception as e:
+        print(f"[{NODE_NAME}] Port bind failed: {e}", flush=True)
+        return
 
-            RECEIVED_IDS.add(msg_id)
-            msg["hop"] += 1
-            msg["ttl"] -= 1
+    while True:
+        try:
+            data, addr = sock.recvfrom(65535)
+            ingest(data, addr, send_forward)
 
-            print(f"[{NODE_NAME}] Received: {msg}", flush=True)
+        except Exception as e:
+            print(f"[{NODE_NAME}] Error in loop: {e}", flush=True)
 
-            log_entry = {
-                "node": NODE_NAME,
-                "from": addr[0],
-                "msg_id": msg["id"],
-                "hop": msg["hop"],
-                "ttl": msg["ttl"],
-                "payload": msg["payload"],
-                "timestamp": time.time()
-            }
+def listen_and_forward_batched():
+    """Batched I/O loop: drain every pending datagram per wakeup, then flush all forwards together.
+
+    The first receive of a batch blocks; the rest pass MSG_DONTWAIT, so a batch
+    costs one recvfrom per datagram and no extra wait syscall.
+    """
+    try:
+        sock = bind_listen_socket()
+        print(f"[{NODE_NAME}] Listening on port {PORT} (worker {WORKER_ID}, batched)...", flush=True)
+    except Exception as e:
+        print(f"[{NODE_NAME}] Port bind failed: {e}", flush=True)
+        return
 
-            with open("events.json", "a") as f:
-                f.write(json.dumps(log_entry) + "\n")
+    outbox = []
 
-            if msg["ttl"] <= 0:
-                print(f"[{NODE_NAME}] 🧯 TTL expired. Not forwarding.", flush=True)
-                continue
+    def queue_forward(data, neighbor, record):
+        outbox.append((data, neighbor, record))
 
-            targets = [ip for ip in KNOWN_PEERS if ip != addr[0]]
-            random.shuffle(targets)
-            for ip in targets[:random.randint(2, 4)]:
-                try:
-                    fwd_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    fwd_sock.sendto(json.dumps(msg).encode(), (ip, PORT))
-                    print(f"[{NODE_NAME}] Forwarded to {ip}:{PORT}", flush=True)
-                except Exception as e:
-                    print(f"[{NODE_NAME}] Forward error: {e}", flush=True)
+    while True:
+        flags = 0  # block for the first datagram of the batch only
+        for _ in range(IO_BATCH_MAX):
+            try:
+                data, addr = sock.recvfrom(65535, flags)
+            except BlockingIOError:
+                break  # drained
+            except OSError as e:
+                print(f"[{NODE_NAME}] Receive error: {e}", flush=True)
+                break
+            flags = socket.MSG_DONTWAIT
+            try:
+                ingest(data, addr, queue_forward)
+            except Exception as e:
+                print(f"[{NODE_NAME}] Error in loop: {e}", flush=True)
 
+        for data, neighbor, record in outbox:
+            try:
+                forward_to(SENDERS, data, neighbor, record)
+            except Exception as e:
+                print(f"[{NODE_NAME}] Forward error: {e}", flush=True)
+        outbox.clear()
+
+class MeshProtocol(asyncio.DatagramProtocol):
+    """asyncio receive path. Link delays become loop timers, so reception never waits on a fan-out."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+        print(f"[{NODE_NAME}] Listening on port {PORT} (asyncio)...", flush=True)
+
+    def datagram_received(self, data, addr):
+        try:
+            ingest(data, addr, self.schedule)
         except Exception as e:
             print(f"[{NODE_NAME}] Error in loop: {e}", flush=True)
 
+    def schedule(self, data, neighbor, record):
+        self.loop.call_later(neighbor.delay, self.forward, data, neighbor, record)
+
+    def forward(self, data, neighbor, record):
+        try:
+            forward_to(self.transport, data, neighbor, record)
+        except Exception as e:
+            print(f"[{NODE_NAME}] Forward error: {e}", flush=True)
+
+    def error_received(self, exc):
+        print(f"[{NODE_NAME}] Socket error: {exc}", flush=True)
+
+async def listen_and_forward_async():
+    loop = asyncio.get_running_loop()
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            MeshProtocol, local_addr=("0.0.0.0", PORT), reuse_port=WORKERS > 1)
+    except Exception as e:
+        print(f"[{NODE_NAME}] Port bind failed: {e}", flush=True)
+        return
+
+    try:
+        await asyncio.Event().wait()  # serve forever
+    finally:
+        transport.close()
+
 if __name__ == "__main__":
-    threading.Thread(target=send_sensor_data_periodically, daemon=True).start()
-    listen_and_forward()
+    if RELIABLE and WORKERS > 1:
+        # sequence numbers and the retransmit buffer are per process, and SO_REUSEPORT hands an ACK to any worker
+        print(f"[{NODE_NAME}] RELIABLE=true needs WORKERS=1; refusing to start with WORKERS={WORKERS}", flush=True)
+        sys.exit(1)
+    if WORKERS > 1 and (FORWARD_STRATEGY == "counter" or HOLDER_TRACKING == "seen"):
+        # COPIES and HOLDERS are per process, so each worker would count only the duplicates SO_REUSEPORT hands it
+        option = "FORWARD_STRATEGY=counter" if FORWARD_STRATEGY == "counter" else "HOLDER_TRACKING=seen"
+        print(f"[{NODE_NAME}] {option} needs WORKERS=1; refusing to start with WORKERS={WORKERS}", flush=True)
+        sys.exit(1)
+    seed_random()
+    if WORKERS > 1:
+        spawn_workers()
+    signal.signal(signal.SIGTERM, shutdown)
+    EVENT_LOG.start()
+    if GATEWAY:
+        GATEWAY_STORE.start()
+    SCHEDULER.start()
+    threading.Thread(target=report_stats_periodically, daemon=True).start()
+    if not PEERS_FILE:
+        resolve_peers()  # with PEERS_FILE, the discovery thread reads the file straight away instead
+    threading.Thread(target=discover_peers_periodically, daemon=True).start()
+    if PEER_SAMPLING == "views":
+        threading.Thread(target=sample_peers_periodically, daemon=True).start()
+    if INGRESS_QUEUE > 0:
+        threading.Thread(target=process_ingress, daemon=True).start()
+    if ANTI_ENTROPY_INTERVAL > 0:
+        threading.Thread(target=anti_entropy_periodically, daemon=True).start()
+    if WORKER_ID == 0:
+        threading.Thread(target=send_sensor_data_periodically, daemon=True).start()
+    if RUNTIME == "asyncio":
+        asyncio.run(listen_and_forward_async())
+    elif RUNTIME == "batch":
+        listen_and_forward_batched()
+    else:
+        listen_and_forward()
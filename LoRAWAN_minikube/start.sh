@@ -57,6 +57,7 @@ echo "Fetching logs from all mesh-node pods"
 for pod in $(kubectl get pods -l app=mesh-node -o jsonpath='{.items[*].metadata.name}'); do
     echo "Fetching log from $pod"
     kubectl cp $pod:/app/events.json collected_logs/${pod}_events.json 2>/dev/null || echo "No events.json found in $pod"
+    kubectl cp $pod:/app/stats.json collected_logs/${pod}_stats.json 2>/dev/null || true
 
     # Backup copy
     # cp collected_logs/${pod}_events.json "$backup_dir/" 2>/dev/null
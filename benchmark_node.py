@@ -0,0 +1,617 @@
+"""
+Node Micro-benchmarks
+Times the hot paths of a version's node.py in-process, without containers or sockets.
+
+Usage:
+    python benchmark_node.py wire [--version LoRAWAN_Docker] [--check]
+    python benchmark_node.py forward [--version LoRAWAN_Subnet]
+    python benchmark_node.py delay [--version LoRAWAN_Subnet]
+    python benchmark_node.py io [--version LoRAWAN_minikube]
+    python benchmark_node.py gateway [--version LoRAWAN_Docker]
+    python benchmark_node.py reliable [--version LoRAWAN_Docker] [--check]
+    python benchmark_node.py views [--check]
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import heapq
+import itertools
+import json
+import os
+import sys
+import time
+import timeit
+import uuid
+import random
+import socket
+import tempfile
+import threading
+from pathlib import Path
+
+VERSIONS = ["LoRAWAN_Docker", "LoRAWAN_Subnet", "LoRAWAN_MutliSubnet", "LoRAWAN_minikube"]
+GENERATORS = {  # the generator each version's start.sh runs; minikube pods are not generated, so the flat rule stands in
+    "LoRAWAN_Docker": "LoRAWAN_Docker/generate_mesh_compose.py",
+    "LoRAWAN_Subnet": "LoRAWAN_Subnet/generate_mesh_compose_subnet.py",
+    "LoRAWAN_MutliSubnet": "LoRAWAN_MutliSubnet/generate_mesh_compose_subnet.py",
+    "LoRAWAN_minikube": "LoRAWAN_Docker/generate_mesh_compose.py",
+}
+CONTROL_FRAME = b"\x03"  # first byte of minikube's PEER_SAMPLING=views control datagrams
+
+
+def load_node(version):
+    """Import <version>/node.py as a module, hiding its startup prints."""
+    path = Path(__file__).parent / version / "node.py"
+    spec = importlib.util.spec_from_file_location(f"node_{version}", path)
+    module = importlib.util.module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+
+def load_generator(version):
+    """Import the version's generate_mesh_compose*.py, for its mesh_topology()."""
+    path = Path(__file__).parent / GENERATORS[version]
+    spec = importlib.util.spec_from_file_location(f"generator_{version}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def sample_message(hop=3, ttl=7):
+    return {
+        "id": str(uuid.uuid4()),
+        "src": "node1",
+        "payload": {
+            "temperature": round(random.uniform(20.0, 30.0), 2),
+            "humidity": round(random.uniform(40.0, 60.0), 2)
+        },
+        "hop": hop,
+        "ttl": ttl,
+        "ts": time.time()
+    }
+
+
+def per_call_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+# ----------------------------
+# Wire format: JSON vs binary
+# ----------------------------
+def bench_wire(node, number):
+    msg = sample_message()
+    json_bytes = json.dumps(msg).encode()
+    binary_bytes = node.encode_binary(msg)
+    assert node.decode_message(binary_bytes)["id"] == msg["id"]
+
+    rows = [
+        ("json", len(json_bytes),
+         per_call_us(lambda: json.dumps(msg).encode(), number),
+         per_call_us(lambda: node.decode_message(json_bytes), number)),
+        ("binary", len(binary_bytes),
+         per_call_us(lambda: node.encode_binary(msg), number),
+         per_call_us(lambda: node.decode_message(binary_bytes), number)),
+    ]
+
+    print(f"{'format':<8} {'bytes':>6} {'encode (us)':>12} {'decode (us)':>12}")
+    for name, size, enc, dec in rows:
+        print(f"{name:<8} {size:>6} {enc:>12.2f} {dec:>12.2f}")
+    print(f"binary is {len(binary_bytes) / len(json_bytes):.0%} of the JSON size on the wire")
+
+
+def wire_cases():
+    """(name, message, carried in binary) covering every branch of encode_binary."""
+    sensor = sample_message()
+    blob = dict(sample_message(), payload={"text": "héllo", "values": [1, 2.5, None]})
+    out_of_range = dict(sample_message(), payload={"temperature": 400.0, "humidity": 700.0})
+    extra = dict(sample_message(), holders=["node2", "node7"], gw="gw1")
+    large = dict(sample_message(hop=300, ttl=2 ** 20), src="n" * 200)
+    return [
+        ("sensor payload", sensor, True),
+        ("JSON payload", blob, True),
+        ("out-of-range sensor", out_of_range, True),
+        ("extra fields", extra, True),
+        ("multi-byte varints", large, True),
+        ("non-uuid id", dict(sample_message(), id="reading-17"), False),
+        ("missing ts", {k: v for k, v in sample_message().items() if k != "ts"}, False),
+        ("negative hop", sample_message(hop=-1), False),
+        ("non-string src", dict(sample_message(), src=7), False),
+    ]
+
+
+def binary_view(msg):
+    """msg as decode_binary returns it: ts in whole ms, a sensor payload in hundredths."""
+    view = dict(msg, ts=round(msg["ts"] * 1000) / 1000)
+    payload = msg["payload"]
+    if isinstance(payload, dict) and payload.keys() == {"temperature", "humidity"} and \
+            all(abs(round(v * 100)) < 2 ** 15 for v in payload.values()):
+        view["payload"] = {k: round(v * 100) / 100 for k, v in payload.items()}
+    return view
+
+
+def check_wire():
+    """Round-trips every wire case through every version's codec, sending from each version to each.
+
+    With WIRE_FORMAT=binary, messages the binary layout cannot carry must fall
+    back to JSON. Every version must decode what every other version sends.
+    """
+    nodes = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for version in VERSIONS:
+            nodes[version] = load_node(version)
+    cases = wire_cases()
+    checked = 0
+    for sender in nodes.values():
+        for wire_format in ("json", "binary"):
+            sender.WIRE_FORMAT = wire_format
+            for name, msg, binary in cases:
+                data = sender.encode_message(msg)
+                as_binary = wire_format == "binary" and binary
+                assert (data[:1] != b"{") == as_binary, f"{name}: sent as {'binary' if data[:1] != b'{' else 'JSON'} with WIRE_FORMAT={wire_format}"
+                expected = binary_view(msg) if as_binary else msg
+                for receiver in nodes.values():
+                    assert receiver.decode_message(data) == expected, f"{name}: {wire_format} round trip changed the message"
+                    checked += 1
+    print(f"check passed: {len(cases)} messages in both formats, {checked} round trips across {len(nodes)} versions")
+    check_bundles(nodes)
+
+
+class DeferredScheduler:
+    """SCHEDULER stand-in that holds every call until run(), so a test decides when windows close."""
+
+    def __init__(self):
+        self.calls = []
+
+    def call_later(self, delay, fn, *args):
+        self.calls.append((fn, args))
+
+    def run(self):
+        while self.calls:
+            fn, args = self.calls.pop(0)
+            fn(*args)
+
+
+def check_bundles(nodes, caps=range(120, 480, 7), rounds=3):
+    """Coalesces mixed JSON and binary messages with each version's Coalescer and unbundles them in every version.
+
+    Every cap is small enough that the messages split over several datagrams;
+    a bundle must never exceed it, and a message too large for any bundle
+    goes out alone. Every version must get the messages back in order.
+    """
+    checked = 0
+    for (version, sender), max_bytes in itertools.product(nodes.items(), caps):
+        sender.WIRE_FORMAT = "binary"
+        msgs = [(msg, binary) for _ in range(rounds) for _, msg, binary in wire_cases()]
+        sent = []
+        sender.forward_to = lambda _sender, data, neighbor, record: sent.append(data) or 0.0  # sent, no wait
+        sender.SCHEDULER = DeferredScheduler()
+        connect(sender, ["10.0.0.2"])
+        coalescer = sender.Coalescer(0.05, max_bytes)
+        for msg, _ in msgs:
+            coalescer.add(sender.encode_message(msg), sender.NEIGHBORS[0], None)
+        sender.SCHEDULER.run()
+
+        bundles = [data for data in sent if data[:1] == bytes([sender.BUNDLE_MARK])]
+        assert len(sent) > 1 and bundles, f"{version}: {len(msgs)} messages were not split into several bundles"
+        assert all(len(data) <= max_bytes for data in bundles), f"{version}: a bundle exceeds {max_bytes} bytes"
+        assert all(len(sender.unbundle(data)) == 1 for data in sent if len(data) > max_bytes), \
+            f"{version}: a message larger than the cap was bundled"
+        expected = [binary_view(msg) if binary else msg for msg, binary in msgs]
+        for name, receiver in nodes.items():
+            received = [receiver.decode_message(part) for data in sent for part in receiver.unbundle(data)]
+            assert received == expected, f"{version} -> {name}: bundles lost, changed or reordered messages"
+            checked += len(received)
+    print(f"check passed: bundles split under {len(caps)} caps from {min(caps)} to {max(caps)} bytes, "
+          f"{checked} messages unbundled across {len(nodes)} versions")
+
+
+# ----------------------------
+# Forward path: serialize per target vs once per message
+# ----------------------------
+class NullSender:
+    def sendto(self, data, addr):
+        return len(data)
+
+
+class NullEventLog:
+    def log(self, entry):
+        pass
+
+
+def forward_per_target(node, msg, addr, targets, sender):
+    """The pre-refactor shape: encode and build the log record inside the target loop."""
+    for neighbor in targets:
+        sender.sendto(node.encode_message(msg), neighbor.sockaddr)
+        print(f"[{node.NODE_NAME}] Forwarded to {neighbor.host}:{neighbor.port}", flush=True)
+        node.EVENT_LOG.log({
+            "node": node.NODE_NAME,
+            "from": addr[0],
+            "msg_id": msg["id"],
+            "hop": msg["hop"],
+            "ttl": msg["ttl"],
+            "payload": msg["payload"],
+            "timestamp": time.time()
+        })
+
+
+def forward_once(node, msg, addr, targets, sender):
+    data, record = node.prepare_forward(msg, addr)
+    for neighbor in targets:
+        node.forward_to(sender, data, neighbor, record)
+
+
+def bench_forward(node, number):
+    node.EVENT_LOG = NullEventLog()  # measure the hot path, not the writer thread
+    sender = NullSender()
+    addr = ("10.0.0.2", 5002)
+    msg = sample_message()
+
+    print(f"{'fan-out':>7} {'per-target (us/pkt)':>20} {'once (us/pkt)':>14} {'saving':>7}")
+    for fan_out in (3, 10):
+        targets = []
+        for i in range(fan_out):
+            neighbor = node.Neighbor(f"node{i}", 5000 + i)
+            neighbor.sockaddr = (f"10.0.0.{i + 10}", 5000 + i)
+            targets.append(neighbor)
+        results = []
+        for fn in (forward_per_target, forward_once):
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.process_time()
+                for _ in range(number):
+                    fn(node, msg, addr, targets, sender)
+                cpu = time.process_time() - start
+            results.append(cpu / (number * fan_out) * 1e6)  # CPU per forwarded packet
+        before, after = results
+        print(f"{fan_out:>7} {before:>20.2f} {after:>14.2f} {1 - after / before:>7.0%}")
+
+
+# ----------------------------
+# Simulated link latency: serial sleeps vs the delay scheduler
+# ----------------------------
+def bench_delay(node, number, fan_out=3):
+    """Messages/s the receive side can hand off while every hop is delayed."""
+    node.EVENT_LOG = NullEventLog()
+    node.SCHEDULER.start()
+    sender = NullSender()
+    addr = ("10.0.0.2", 5002)
+    msg = sample_message()
+    targets = []
+    for i in range(fan_out):
+        neighbor = node.Neighbor(f"node{i}", 5000 + i)
+        neighbor.sockaddr = (f"10.0.0.{i + 10}", 5000 + i)
+        targets.append(neighbor)
+
+    print(f"{'latency (s)':>11} {'serial sleep (msg/s)':>21} {'scheduler (msg/s)':>18}")
+    for latency in (0.0, 0.01, 0.05, 0.1):
+        for neighbor in targets:
+            neighbor.delay = latency
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            serial_n = max(1, min(number, int(2 / (latency * fan_out)) if latency else number))
+            start = time.perf_counter()
+            for _ in range(serial_n):
+                data, record = node.prepare_forward(msg, addr)
+                for neighbor in targets:
+                    time.sleep(neighbor.delay)
+                    node.forward_to(sender, data, neighbor, record)
+            serial = serial_n / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for _ in range(number):
+                data, record = node.prepare_forward(msg, addr)
+                for neighbor in targets:
+                    node.SCHEDULER.call_later(neighbor.sample_delay(), node.forward_to, sender, data, neighbor, record)
+            scheduled = number / (time.perf_counter() - start)
+            while node.SCHEDULER.pending():
+                time.sleep(0.01)
+        print(f"{latency:>11} {serial:>21.0f} {scheduled:>18.0f}")
+
+
+# ----------------------------
+# Socket I/O: one recvfrom per wakeup vs drain-and-flush batches
+# ----------------------------
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def packets_per_second(node, loop_name, number, fan_out, window=128):
+    """Closed-loop load: keep `window` datagrams in flight and time how fast the node dedupes them."""
+    node.EVENT_LOG = NullEventLog()
+    node.PORT = free_udp_port()
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    peers = []
+    for i in range(fan_out):
+        neighbor = node.Neighbor("127.0.0.1", sink.getsockname()[1])
+        neighbor.sockaddr = sink.getsockname()
+        peers.append(neighbor)
+    node.NEIGHBORS = peers
+    node.KNOWN_PEERS = peers
+    threading.Thread(target=getattr(node, loop_name), daemon=True).start()
+    time.sleep(0.2)
+
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packets = [node.encode_message(sample_message()) for _ in range(number)]
+    dedup = node.RECEIVED_IDS
+    start = time.perf_counter()
+    sent = 0
+    while dedup.misses < number:
+        while sent < number and sent - dedup.misses < window:
+            client.sendto(packets[sent], ("127.0.0.1", node.PORT))
+            sent += 1
+        time.sleep(0)
+        if time.perf_counter() - start > 30:
+            break  # lost packets; report what got through
+    elapsed = time.perf_counter() - start
+    client.close()
+    sink.close()
+    return dedup.misses / elapsed
+
+
+def bench_io(version, number, fan_out=3, repeat=7):
+    """Packets/s of both loops, alternating them over `repeat` runs.
+
+    The sender shares the process, so single runs swing by 20% or more;
+    compare the medians, and the range before reading anything into them.
+    """
+    runs = {"listen_and_forward": [], "listen_and_forward_batched": []}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            for loop_name, results in runs.items():
+                results.append(packets_per_second(load_node(version), loop_name, number, fan_out))
+        time.sleep(0.5)  # let the last loop finish its backlog while its output still goes to devnull
+    print(f"{'loop':<28} {'median':>8} {'min':>8} {'max':>8}  (packets/s, fan-out {fan_out}, {repeat} runs)")
+    for loop_name, results in runs.items():
+        results.sort()
+        print(f"{loop_name:<28} {results[len(results) // 2]:>8.0f} {results[0]:>8.0f} {results[-1]:>8.0f}")
+
+
+# ----------------------------
+# Gateway role: uplinks/s one gateway stores, by insert batch size
+# ----------------------------
+def bench_gateway(node, number, nodes=120, paths=3):
+    """Replay `number` uplinks from a `nodes`-node mesh, each arriving over `paths` paths, into a gateway."""
+    node.EVENT_LOG = NullEventLog()
+    node.GATEWAY = True
+    uplinks = []
+    for i in range(number):
+        msg = sample_message(hop=random.randint(2, 8))
+        msg["src"] = f"node{i % nodes + 1}"
+        uplinks.append(msg)
+    arrivals = [(dict(msg), (f"10.0.{p}.{i % 250 + 1}", 5000)) for p in range(paths) for i, msg in enumerate(uplinks)]
+    random.shuffle(arrivals)  # copies from different paths interleave
+
+    print(f"{'batch':>6} {'uplinks/s':>10} {'stored':>8} {'transactions':>13}  ({paths} paths per uplink)")
+    for batch in (1, 50, 500):
+        node.RECEIVED_IDS = node.DedupCache(node.DEDUP_TTL, max(number, node.DEDUP_MAX_ENTRIES))
+        with tempfile.TemporaryDirectory() as tmp:
+            store = node.GatewayStore(os.path.join(tmp, "uplinks.db"), batch, flush_interval=0.05)
+            node.GATEWAY_STORE = store
+            store.start()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                for msg, addr in arrivals:
+                    node.handle_message(dict(msg), addr, None)
+                while store.counters["stored"] < number:
+                    time.sleep(0.001)
+                elapsed = time.perf_counter() - start
+            store.close()
+        print(f"{batch:>6} {number / elapsed:>10.0f} {store.counters['stored']:>8} {store.counters['batches']:>13}")
+
+
+# ----------------------------
+# In-process mesh: many node modules exchanging datagrams without sockets
+# ----------------------------
+class FakeNetwork:
+    """Delivers what loaded node modules send to the module that owns the destination IP, after latency(src, dst)."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.nodes = {}  # ip -> node module
+        self.heap = []
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.datagrams = 0
+        self.control = 0  # of those, peer-sampling control frames
+        threading.Thread(target=self.dispatch, daemon=True).start()
+
+    def add(self, ip, node, deliveries):
+        node.SENDERS = FakeSender(self, ip)
+        node.EVENT_LOG = DeliveryLog(deliveries, ip)
+        node.SCHEDULER.start()
+        self.nodes[ip] = node
+        return node
+
+    def send(self, data, src, dst):
+        self.datagrams += 1
+        self.control += data[:1] == CONTROL_FRAME
+        with self.cond:
+            heapq.heappush(self.heap, (time.monotonic() + self.latency(src, dst), next(self.seq), src, dst, data))
+            self.cond.notify()
+
+    def dispatch(self):
+        while True:
+            with self.cond:
+                while not self.heap:
+                    self.cond.wait()
+                due = self.heap[0][0] - time.monotonic()
+                if due > 0:
+                    self.cond.wait(due)
+                    continue
+                _, _, src, dst, data = heapq.heappop(self.heap)
+            node = self.nodes.get(dst)
+            if node is None:
+                continue
+            try:
+                node.ingest(data, (src, self.nodes[src].PORT), node.send_forward)
+            except Exception as e:
+                print(f"[{dst}] Error in loop: {e}", file=sys.stderr, flush=True)
+
+
+class FakeSender:
+    def __init__(self, network, ip):
+        self.network = network
+        self.ip = ip
+
+    def sendto(self, data, addr):
+        self.network.send(bytes(data), self.ip, addr[0])
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class DeliveryLog:
+    """EVENT_LOG stand-in: msg id -> {ip: hop} for every node that received the message."""
+
+    def __init__(self, deliveries, ip):
+        self.deliveries = deliveries
+        self.ip = ip
+
+    def log(self, entry):
+        self.deliveries.setdefault(entry["msg_id"], {})[self.ip] = entry["hop"]
+
+    def close(self):
+        pass
+
+
+def connect(node, ips, port=5000):
+    neighbors = []
+    for ip in ips:
+        if hasattr(node, "link_class"):
+            neighbor = node.Neighbor(ip, port, "direct", 0.0)
+        else:
+            neighbor = node.Neighbor(ip, port)
+        neighbor.sockaddr = (ip, port)
+        neighbor.stale = False
+        neighbors.append(neighbor)
+    node.NEIGHBORS = node.KNOWN_PEERS = neighbors
+
+
+def originate(node, ip, ttl):
+    """One fresh reading from node, sent the way its send loop would."""
+    msg = sample_message(hop=1, ttl=ttl)
+    msg["src"] = node.NODE_NAME
+    data = node.encode_message(msg)
+    for neighbor in node.forward_targets(msg, (ip, node.PORT)):
+        node.send_datagram(node.SENDERS, data, neighbor.sockaddr)
+    return msg["id"]
+
+
+# ----------------------------
+# Per-hop reliability under LOSS_RATE
+# ----------------------------
+def bench_reliable(version, check, nodes=30, neighbors=3, loss=0.2, messages=20):
+    """Delivery on a lossy in-process mesh without and with RELIABLE.
+
+    LOSS_RATE drops datagrams before the link layer sees them, so a lost frame
+    is not ACKed and its sender must retransmit it. --check asserts that.
+    """
+    print(f"{'RELIABLE':<9} {'delivery':>9} {'datagrams':>10} {'lost':>6} {'retransmits':>12} {'acks':>6} {'gave up':>8}"
+          f"  ({nodes} nodes, LOSS_RATE={loss})")
+    results = {}
+    for reliable in ("false", "true"):
+        random.seed(1)
+        network = FakeNetwork(lambda src, dst: 0.002)
+        deliveries = {}
+        ips = [f"10.0.0.{i + 1}" for i in range(nodes)]
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for ip in ips:
+                os.environ.update(NODE_NAME=ip, POD_IP=ip, LISTEN_PORT="5000", RELIABLE=reliable, LOSS_RATE=str(loss))
+                node = network.add(ip, load_node(version), deliveries)
+                connect(node, random.sample([peer for peer in ips if peer != ip], neighbors))
+            ids = [originate(network.nodes[ips[k % nodes]], ips[k % nodes], 10) for k in range(messages)]
+            time.sleep(4)  # RETRY_BASE 0.2 doubled over RETRY_MAX 4 retries
+        link = {key: sum(node.LINK.counters[key] for node in network.nodes.values())
+                for key in ("retransmits", "acks_sent", "gave_up")}
+        lost = sum(node.INGRESS.drops["lost"] for node in network.nodes.values())
+        delivery = sum(len(deliveries.get(msg_id, ())) for msg_id in ids) / (messages * (nodes - 1))
+        results[reliable] = dict(link, lost=lost)
+        print(f"{reliable:<9} {delivery:>9.1%} {network.datagrams:>10} {lost:>6} {link['retransmits']:>12} "
+              f"{link['acks_sent']:>6} {link['gave_up']:>8}")
+
+    if check:
+        assert results["true"]["lost"] > 0, "LOSS_RATE dropped nothing"
+        assert results["true"]["retransmits"] > 0, "lost frames were ACKed: RELIABLE never retransmitted"
+        print("check passed: frames lost to LOSS_RATE are retransmitted")
+
+
+# ----------------------------
+# Minikube peer sampling: views vs random peers
+# ----------------------------
+def bench_views(check, nodes=120, messages=5, ttl=25, rounds=15):
+    """Reach, hops and transmissions per message with PEER_SAMPLING=off and =views.
+
+    The pods share one in-process network where pods on the same emulated k8s
+    host (same last octet mod 8) are 1 ms apart and all others 10 ms, so the
+    views have something to optimise. Control frames are not counted as
+    transmissions. --check asserts the views reach at least as many pods as
+    random forwarding, with fewer transmissions.
+    """
+    def latency(src, dst):
+        return 0.001 if int(src.rsplit(".", 1)[1]) % 8 == int(dst.rsplit(".", 1)[1]) % 8 else 0.01
+
+    print(f"{'PEER_SAMPLING':<14} {'reach':>7} {'max hop':>8} {'avg hop':>8} {'transmissions':>14}"
+          f"  (per message, {nodes} pods, {messages} messages)")
+    results = {}
+    for sampling in ("off", "views"):
+        random.seed(1)
+        network = FakeNetwork(latency)
+        deliveries = {}
+        ips = [f"10.0.0.{i + 1}" for i in range(nodes)]
+        rows = []
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for ip in ips:
+                os.environ.update(NODE_NAME=ip, POD_IP=ip, PEER_SAMPLING=sampling)
+                network.add(ip, load_node("LoRAWAN_minikube"), deliveries).update_peers(ips)
+            if sampling == "views":
+                for _ in range(rounds):  # let the views form and settle on the fast links
+                    for node in network.nodes.values():
+                        node.SAMPLER.tick()
+                    time.sleep(0.05)
+            for k in range(messages):
+                sent = network.datagrams - network.control
+                msg_id = originate(network.nodes[ips[k]], ips[k], ttl)
+                time.sleep(0.5)
+                hops = deliveries.get(msg_id, {})
+                rows.append((len(hops), max(hops.values(), default=0), sum(hops.values()) / max(1, len(hops)),
+                             network.datagrams - network.control - sent))
+        results[sampling] = rows
+        for reach, max_hop, avg_hop, transmissions in rows:
+            print(f"{sampling:<14} {reach:>7} {max_hop:>8} {avg_hop:>8.2f} {transmissions:>14}")
+
+    if check:
+        off, views = results["off"], results["views"]
+        assert sum(row[0] for row in views) >= sum(row[0] for row in off), "the views reached fewer pods than random peers"
+        assert sum(row[3] for row in views) < sum(row[3] for row in off), "the views did not save transmissions"
+        print("check passed: the views reach as many pods as random peers with fewer transmissions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bench", choices=["wire", "forward", "delay", "io", "gateway", "reliable", "views"])
+    parser.add_argument("--version", choices=VERSIONS, default="LoRAWAN_Docker")
+    parser.add_argument("--number", type=int, default=20000, help="calls per timing run")
+    parser.add_argument("--check", action="store_true", help="assert the expected behavior instead of only reporting it")
+    args = parser.parse_args()
+
+    node = load_node(args.version)
+    if args.bench == "wire":
+        bench_wire(node, args.number)
+        if args.check:
+            check_wire()
+    elif args.bench == "forward":
+        bench_forward(node, args.number // 10)
+    elif args.bench == "delay":
+        bench_delay(node, args.number // 10)
+    elif args.bench == "io":
+        bench_io(args.version, args.number // 2)
+    elif args.bench == "gateway":
+        bench_gateway(node, args.number)
+    elif args.bench == "reliable":
+        bench_reliable(args.version, args.check)
+    elif args.bench == "views":
+        bench_views(args.check)
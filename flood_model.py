@@ -0,0 +1,255 @@
+"""
+Flooding Model
+Computes what a flood over the mesh would deliver without running it: reach,
+hop counts, duplicates and per-node load for one message from every source,
+by level-synchronous BFS on a sparse adjacency matrix. Every hop is one sparse
+matrix product, and all sources in a batch are advanced together.
+
+The model follows node.py: a node logs the first copy it receives, relays it to
+all of its NEXT_NODES while TTL remains, and counts later copies as duplicates.
+The source does not mark its own message as seen, so it can receive it back.
+Copies travel one hop per step, so the first copy always comes over a shortest path.
+
+The topology is read from a docker-compose.yml written by generate_mesh_compose*.py,
+or built by the --version's generator for every point of a parameter grid.
+
+Usage:
+    python flood_model.py --compose LoRAWAN_Docker/docker-compose.yml --ttl 10 --report mesh_metrics.txt
+    python flood_model.py --nodes 120 --neighbors 2,3,4,5 --ttl 5,10,15 --subnets 1,4 --csv sweep.csv
+    python flood_model.py --nodes 10000 --neighbors 3 --ttl 10 --gossip 0.65 --loss 0.1 --sources 500
+"""
+
+import argparse
+import csv
+import itertools
+import random
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from benchmark_node import VERSIONS
+
+
+def topology_adjacency(topology):
+    """(adjacency, node names, START_NODE indices) for [(name, port, [(host, port), ...], start_node)].
+
+    Row u, column v: v is in u's NEXT_NODES.
+    """
+    index = {name: i for i, (name, _, _, _) in enumerate(topology)}
+    rows, cols, starts = [], [], []
+    for name, _, targets, start_node in topology:
+        for host, _ in targets:
+            if host in index:
+                rows.append(index[name])
+                cols.append(index[host])
+        if start_node:
+            starts.append(index[name])
+    n = len(topology)
+    adjacency = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n, n))
+    return adjacency, list(index), starts
+
+
+def random_adjacency(version, num_nodes, max_neighbors, subnet_count, rng):
+    """topology_adjacency() of a mesh built by the version's generate_mesh_compose*.py."""
+    from simulate_mesh import random_topology
+
+    return topology_adjacency(random_topology(version, num_nodes, max_neighbors, subnet_count, 1, rng))
+
+
+def compose_adjacency(path):
+    """topology_adjacency() of a generated docker-compose.yml."""
+    from simulate_mesh import read_compose
+
+    return topology_adjacency(read_compose(path))
+
+
+def flood(adjacency, sources, ttl, rng, loss=0.0, gossip_prob=1.0, gossip_min_hops=2):
+    """Flood one message from each source. Returns per-node arrays of shape (nodes, len(sources)).
+
+    dist: hops from the source to the first copy, -1 if never reached (the logged hop is dist + 1)
+    received: copies that arrived, including the first
+    sent: datagrams sent
+    With loss > 0 every datagram is lost with that chance. With gossip_prob < 1
+    a relay past gossip_min_hops rebroadcasts with that chance.
+    """
+    n, s = adjacency.shape[0], len(sources)
+    incoming = adjacency.T.tocsr()
+    out_degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    dist = np.full((n, s), -1, dtype=np.int16)
+    received = np.zeros((n, s), dtype=np.int32)
+    sent = np.zeros((n, s), dtype=np.int32)
+    forwarding = np.zeros((n, s), dtype=bool)
+    forwarding[sources, np.arange(s)] = True  # the sensor reading always goes out
+    for d in range(1, ttl + 1):
+        if not forwarding.any():
+            break
+        sent += forwarding * out_degree[:, None]
+        links = incoming
+        if loss > 0:
+            links = incoming.copy()
+            links.data = (rng.random(links.nnz) >= loss).astype(np.int32)
+        copies = links @ forwarding.astype(np.int32)
+        received += copies
+        first = (copies > 0) & (dist < 0)
+        dist[first] = d
+        forwarding = first if d < ttl else np.zeros_like(first)  # ttl left after this hop: ttl - d
+        if gossip_prob < 1 and d + 1 > gossip_min_hops:
+            forwarding &= rng.random(forwarding.shape) < gossip_prob
+    return dist, received, sent
+
+
+def flood_metrics(adjacency, sources, ttl, rng, loss=0.0, gossip_prob=1.0, gossip_min_hops=2, batch=256):
+    """The mesh_metrics.txt figures for one message from each source, in batches of sources."""
+    n = adjacency.shape[0]
+    hops, reach, max_hop, dead_ends = [], [], [], []
+    load = np.zeros(n, dtype=np.int64)  # first receipts, i.e. events.json lines, per node
+    rx = np.zeros(n, dtype=np.int64)
+    tx = np.zeros(n, dtype=np.int64)
+    expired = duplicates = 0
+    for start in range(0, len(sources), batch):
+        dist, received, sent = flood(adjacency, sources[start:start + batch], ttl, rng, loss, gossip_prob, gossip_min_hops)
+        reached = dist >= 0
+        hops.append(dist[reached] + 1)
+        reach.append(reached.sum(axis=0))
+        max_hop.append(np.where(reached, dist + 1, 0).max(axis=0))
+        dead_ends.append(n - ((sent > 0) & reached).sum(axis=0))
+        expired += int((dist == ttl).sum())
+        duplicates += int(received.sum() - reached.sum())
+        load += reached.sum(axis=1)
+        rx += received.sum(axis=1)
+        tx += sent.sum(axis=1)
+    hops, reach, max_hop = np.concatenate(hops), np.concatenate(reach), np.concatenate(max_hop)
+    deliveries = max(int(reach.sum()), 1)
+    energy = tx * 1 + rx * 0.5  # analyze_mesh.py weights: 1 unit per send, 0.5 per receive
+    spread = reach[max_hop > 0] / max_hop[max_hop > 0]
+    return {
+        "Total Unique Messages": len(sources),
+        "Total Nodes": n,
+        "Nodes That Received Messages": int((load > 0).sum()),
+        "TTL Expiry Events": expired,
+        "Maximum Hops": int(hops.max()) if len(hops) else 0,
+        "Minimum Hops": int(hops.min()) if len(hops) else 0,
+        "Average Hops": round(float(hops.mean()), 2) if len(hops) else 0,
+        "Most Active Node": int(load.argmax()),
+        "Least Active Node": int(load.argmin()),
+        "Message Delivery Ratio": round(float((reach > 1).mean()), 4),
+        "Dead-End Nodes (avg per message)": round(float(np.concatenate(dead_ends).mean()), 2),
+        "Average Delivery Ratio": round(float(reach.mean() / n * 100), 2),
+        "Total Duplicates (copies after the first)": duplicates,
+        "Datagrams per Delivery": round(float(tx.sum() / deliveries), 2),
+        "Avg Energy Used per Node": round(float(energy.mean()), 2),
+        "Energy per Delivered Message": round(float(energy.sum() / deliveries), 2),
+        "Average Spread Efficiency": round(float(spread.mean()), 4) if len(spread) else 0,
+        "Jain's Fairness Index": round(float(load.sum() ** 2 / (n * (load ** 2).sum())), 4) if load.any() else 0,
+        "_load": load,
+    }
+
+
+def write_report(path, metrics, names):
+    """mesh_metrics.txt layout, for the figures the model can give."""
+    load = metrics["_load"]
+    most, least = int(load.argmax()), int(load.argmin())
+    with open(path, "w") as f:
+        f.write("Mesh Network Flooding Model Report\n")
+        f.write("=" * 50 + "\n\n")
+        f.write("1. Message Statistics\n" + "-" * 20 + "\n")
+        for key in ("Total Unique Messages", "Total Nodes", "Nodes That Received Messages", "TTL Expiry Events"):
+            f.write(f"{key}: {metrics[key]}\n")
+        f.write("\n2. Hop Statistics\n" + "-" * 20 + "\n")
+        for key in ("Maximum Hops", "Minimum Hops", "Average Hops"):
+            f.write(f"{key}: {metrics[key]}\n")
+        f.write("\n4. Node Activity\n" + "-" * 20 + "\n")
+        f.write(f"Most Active Node: {names[most]} ({load[most]} messages)\n")
+        f.write(f"Least Active Node: {names[least]} ({load[least]} messages)\n")
+        f.write("\n5. Advanced Metrics\n" + "-" * 20 + "\n")
+        f.write(f"Message Delivery Ratio: {metrics['Message Delivery Ratio']}\n")
+        f.write(f"Dead-End Nodes (avg per message): {metrics['Dead-End Nodes (avg per message)']}\n")
+        f.write("\n6. Delivery Quality\n" + "-" * 20 + "\n")
+        f.write(f"Average Delivery Ratio: {metrics['Average Delivery Ratio']}%\n")
+        f.write(f"Total Duplicates (copies after the first): {metrics['Total Duplicates (copies after the first)']}\n")
+        f.write("\n7. Energy Metrics\n" + "-" * 20 + "\n")
+        f.write(f"Avg Energy Used per Node: {metrics['Avg Energy Used per Node']:.2f} units\n")
+        f.write(f"Energy per Delivered Message: {metrics['Energy per Delivered Message']:.2f} units\n")
+        f.write("\n8. Spread Efficiency\n---------------------\n")
+        f.write(f"Average Spread Efficiency (reach / hops): {metrics['Average Spread Efficiency']:.4f}\n")
+        f.write("\n9. Network Fairness\n---------------------\n")
+        fairness = metrics["Jain's Fairness Index"]
+        f.write(f"Jain's Fairness Index on Node Load: {fairness:.4f}\n")
+        f.write("\n10. Link Layer\n---------------------\n")
+        f.write(f"Datagrams per Delivery: {metrics['Datagrams per Delivery']:.2f}\n")
+
+
+def parse_list(text, kind):
+    return [kind(item) for item in text.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compose", help="docker-compose.yml to take the topology from")
+    parser.add_argument("--version", choices=VERSIONS, default="LoRAWAN_Subnet",
+                        help="whose generate_mesh_compose*.py builds the grid's topologies")
+    parser.add_argument("--nodes", default="120", help="comma-separated grid of num_nodes")
+    parser.add_argument("--neighbors", default="3", help="comma-separated grid of max_neighbors")
+    parser.add_argument("--subnets", default="1", help="comma-separated grid of subnet_count (1 = one network)")
+    parser.add_argument("--ttl", default="10", help="comma-separated grid of TTLs")
+    parser.add_argument("--gossip", default="1.0", help="comma-separated grid of GOSSIP_PROB (1.0 = flood)")
+    parser.add_argument("--gossip-min-hops", type=int, default=2)
+    parser.add_argument("--loss", default="0", help="comma-separated grid of per-datagram loss rates")
+    parser.add_argument("--sources", type=int, default=0,
+                        help="messages per point, from random sources (0 = every node, or the START_NODEs of --compose)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--csv", help="write one row per grid point here")
+    parser.add_argument("--report", help="write a mesh_metrics.txt-style report of the first grid point here")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    topology_rng = random.Random(args.seed)
+    if args.compose:
+        adjacency, names, starts = compose_adjacency(args.compose)
+        topologies = [({"num_nodes": adjacency.shape[0]}, lambda: (adjacency, names))]
+        if not args.sources and starts:
+            args.sources = starts  # the START_NODEs, as in the container run
+    else:
+        topologies = []
+        for num_nodes, max_neighbors, subnet_count in itertools.product(
+                parse_list(args.nodes, int), parse_list(args.neighbors, int), parse_list(args.subnets, int)):
+            build = (lambda n=num_nodes, k=max_neighbors, s=subnet_count:
+                     random_adjacency(args.version, n, k, s, topology_rng)[:2])
+            topologies.append(({"num_nodes": num_nodes, "max_neighbors": max_neighbors, "subnet_count": subnet_count}, build))
+
+    columns = ["Average Delivery Ratio", "Average Hops", "Maximum Hops", "TTL Expiry Events",
+               "Total Duplicates (copies after the first)", "Datagrams per Delivery", "Jain's Fairness Index"]
+    rows = []
+    for topology, build in topologies:
+        try:
+            adjacency, names = build()
+        except ValueError as e:
+            parser.error(f"{args.version}: {e}")
+        n = adjacency.shape[0]
+        if isinstance(args.sources, list):
+            sources = np.array(args.sources)
+        elif args.sources:
+            sources = rng.choice(n, size=min(args.sources, n), replace=False)
+        else:
+            sources = np.arange(n)
+        for ttl, gossip_prob, loss in itertools.product(
+                parse_list(args.ttl, int), parse_list(args.gossip, float), parse_list(args.loss, float)):
+            started = time.perf_counter()
+            metrics = flood_metrics(adjacency, sources, ttl, rng, loss, gossip_prob, args.gossip_min_hops)
+            point = dict(topology, ttl=ttl, gossip_prob=gossip_prob, loss=loss)
+            if args.report and not rows:
+                write_report(args.report, metrics, names)
+            metrics["Most Active Node"] = names[metrics["Most Active Node"]]
+            metrics["Least Active Node"] = names[metrics["Least Active Node"]]
+            rows.append(dict(point, **{k: v for k, v in metrics.items() if not k.startswith("_")},
+                             seconds=round(time.perf_counter() - started, 3)))
+            print(" ".join(f"{k}={v}" for k, v in point.items()) + " | " +
+                  ", ".join(f"{k}: {metrics[k]}" for k in columns), flush=True)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"{len(rows)} grid points written to {args.csv}")
@@ -0,0 +1,270 @@
+"""
+Discrete-Event Mesh Simulator
+Runs a version's node.py receive/dedup/TTL/forwarding logic for every node of a
+mesh in one process, on a virtual clock, without containers or sockets.
+
+The topology comes from a docker-compose.yml written by generate_mesh_compose*.py
+(NEXT_NODES and START_NODE of every service), or is built for --nodes N by the
+same mesh_topology() the version's generator uses. Node options such as FORWARD_STRATEGY or HOLDER_TRACKING are read
+from the environment, as in a container. Each node's events.json is written to
+<out>/collected_logs/<node>_events.json, so analyze_mesh.py runs unchanged from <out>.
+
+Usage:
+    python simulate_mesh.py --compose LoRAWAN_Docker/docker-compose.yml [--version LoRAWAN_Docker]
+    python simulate_mesh.py --nodes 10000 --duration 60 --out sim_10k
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import random
+import time
+from pathlib import Path
+
+import yaml
+
+from benchmark_node import VERSIONS, load_generator, load_node
+
+
+class VirtualClock:
+    """Stands in for the time module inside node.py: time() and monotonic() follow the simulation."""
+
+    def __init__(self, epoch):
+        self.epoch = epoch
+        self.now = 0.0
+
+    def time(self):
+        return self.epoch + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+class VirtualNode:
+    """Per-node state that node.py keeps in module globals."""
+
+    def __init__(self, node, name, ip, port, path_id):
+        self.name = name
+        self.ip = ip
+        self.port = port
+        self.path_id = path_id
+        self.neighbors = []
+        if node.DEDUP_MODE == "bloom":
+            self.dedup = node.RotatingBloomFilter(node.DEDUP_TTL, node.DEDUP_MAX_ENTRIES, node.DEDUP_FP_RATE)
+        else:
+            self.dedup = node.DedupCache(node.DEDUP_TTL, node.DEDUP_MAX_ENTRIES)
+        self.holders = node.HolderTable()
+        self.copies = node.CopyCounter()
+        self.events = []
+
+    def log(self, entry):
+        self.events.append(entry)
+
+
+class Simulation:
+    """Event heap of (virtual time, seq, node, callback, args), run in time order.
+
+    Before each callback the node's state is swapped into the node.py module,
+    so receive_message(), fan_out() and the strategies run exactly as in a
+    container. node.py's SCHEDULER and send_forward() are replaced, so holds and
+    forwards become future events instead of timers and sockets.
+    """
+
+    def __init__(self, node, latency, loss):
+        self.node = node
+        self.latency = latency
+        self.loss = loss
+        self.heap = []
+        self.seq = itertools.count()
+        self.current = None
+        self.nodes = {}  # name -> VirtualNode
+        self.by_ip = {}
+        self.datagrams = 0
+        self.lost = 0
+        self.minikube = hasattr(node, "KNOWN_PEERS") and hasattr(node, "SAMPLER")
+        self.ttl = node.MSG_TTL  # what send_sensor_data_periodically() uses
+        self.clock = VirtualClock(time.time())
+        node.time = self.clock
+        node.print = lambda *args, **kwargs: None  # node logs would dominate the run time
+        node.SCHEDULER = self
+        node.send_forward = self.send
+        node.AGGREGATE_WINDOW = 0  # link-layer options are not simulated
+        node.ANTI_ENTROPY_INTERVAL = 0
+        node.RELIABLE = False
+        node.INGRESS_QUEUE = 0
+        node.GATEWAY = False
+
+    def add_node(self, name, port):
+        ip = f"10.{len(self.nodes) // 65536 % 256}.{len(self.nodes) // 256 % 256}.{len(self.nodes) % 256}"
+        vnode = VirtualNode(self.node, name, ip, port, ip if self.minikube else name)
+        self.nodes[name] = self.by_ip[ip] = vnode
+        return vnode
+
+    def connect(self, vnode, targets):
+        for host, port in targets:
+            peer = self.nodes.get(host)
+            if peer is None:
+                continue
+            if hasattr(self.node, "link_class"):
+                link = self.node.link_class(host)
+                neighbor = self.node.Neighbor(peer.path_id, port, link, self.node.LINK_DELAYS[link])
+            else:
+                neighbor = self.node.Neighbor(peer.path_id, port)
+            neighbor.sockaddr = (peer.ip, port)
+            neighbor.stale = False
+            vnode.neighbors.append(neighbor)
+
+    def activate(self, vnode):
+        node = self.node
+        self.current = vnode
+        node.NODE_NAME = vnode.name
+        node.PATH_ID = vnode.path_id
+        node.PORT = vnode.port
+        node.RECEIVED_IDS = vnode.dedup
+        node.NEIGHBORS = node.KNOWN_PEERS = vnode.neighbors
+        node.HOLDERS = vnode.holders
+        node.COPIES = vnode.copies
+        node.EVENT_LOG = vnode
+
+    # node.SCHEDULER interface
+    def call_later(self, delay, fn, *args):
+        self.push(delay, self.current, fn, args)
+
+    def push(self, delay, vnode, fn, args):
+        heapq.heappush(self.heap, (self.clock.now + delay, next(self.seq), vnode, fn, args))
+
+    def pending(self):
+        return len(self.heap)
+
+    def start(self):
+        pass
+
+    # node.send_forward(): one datagram to one neighbor
+    def send(self, data, neighbor, record):
+        link_delay = neighbor.sample_delay() if hasattr(neighbor, "sample_delay") else 0.0  # Subnet link classes
+        if record is not None:
+            self.current.log(dict(record, timestamp=self.clock.time() + link_delay))  # stamped at the actual send time
+        self.datagrams += 1
+        if random.random() < self.loss:
+            self.lost += 1
+            return
+        dst = self.by_ip[neighbor.sockaddr[0]]
+        self.push(link_delay + self.latency, dst, self.node.ingest, (data, (self.current.ip, self.current.port), self.send))
+
+    def send_reading(self, vnode, interval, until):
+        """send_sensor_data_periodically() for one START_NODE, one reading per call.
+
+        The minikube version picks its 2-4 random peers among the node's NEXT_NODES.
+        prepare_forward() from the node itself builds the data and, for the Subnet
+        versions, the hop-1 record (from = the source node) that node.py logs per send.
+        """
+        node = self.node
+        msg = {
+            "id": str(node.uuid.UUID(int=random.getrandbits(128), version=4)),  # reproducible under --seed
+            "src": vnode.name,
+            "payload": {
+                "temperature": round(random.uniform(20.0, 30.0), 2),
+                "humidity": round(random.uniform(40.0, 60.0), 2)
+            },
+            "hop": 1,
+            "ttl": self.ttl,
+            "ts": self.clock.time()
+        }
+        if node.HOLDER_TRACKING == "path":
+            msg["via"] = [vnode.path_id]
+        data, record = node.prepare_forward(msg, (vnode.name, vnode.port))
+        for neighbor in node.forward_targets(msg, (vnode.ip, vnode.port)):
+            self.send(data, neighbor, record)
+        if self.clock.now + interval < until:
+            self.call_later(interval, self.send_reading, vnode, interval, until)
+
+    def run(self, until):
+        while self.heap and self.heap[0][0] <= until:
+            self.clock.now, _, vnode, fn, args = heapq.heappop(self.heap)
+            self.activate(vnode)
+            fn(*args)
+        self.clock.now = max(self.clock.now, until)
+
+    def write_events(self, log_dir):
+        log_dir.mkdir(parents=True, exist_ok=True)
+        for vnode in self.nodes.values():
+            with open(log_dir / f"{vnode.name}_events.json", "w") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in vnode.events)
+
+
+def simulate(node, topology, duration, interval=10, latency=0.001, loss=0.0):
+    """Build a Simulation of topology, with every START_NODE sending a reading each interval, and run it."""
+    sim = Simulation(node, latency, loss)
+    for name, port, _, _ in topology:
+        sim.add_node(name, port)
+    for name, _, targets, start_node in topology:
+        vnode = sim.nodes[name]
+        sim.connect(vnode, targets)
+        if start_node:
+            sim.current = vnode
+            sim.call_later(3, sim.send_reading, vnode, interval, duration)  # same startup buffer as node.py
+    sim.run(duration)
+    return sim
+
+
+def read_compose(path):
+    """[(name, port, [(host, port), ...], start_node)] from a generated docker-compose.yml."""
+    with open(path) as f:
+        services = yaml.safe_load(f)["services"]
+    topology = []
+    for service in services.values():
+        env = dict(item.split("=", 1) for item in service.get("environment", []))
+        targets = [(host, int(port)) for host, port in
+                   (item.strip().split(":") for item in env.get("NEXT_NODES", "").split(",") if ":" in item)]
+        topology.append((env["NODE_NAME"], int(env.get("LISTEN_PORT", "5000")), targets,
+                         env.get("START_NODE", "false").lower() == "true"))
+    return topology
+
+
+def random_topology(version, num_nodes, max_neighbors, subnet_count, sources, rng, base_port=5000):
+    """[(name, port, [(host, port), ...], start_node)] from the version's generate_mesh_compose*.py.
+
+    The first `sources` nodes are START_NODEs.
+    """
+    generated = load_generator(version).mesh_topology(num_nodes, max_neighbors, subnet_count, rng, base_port)
+    return [(name, port, [(host, int(target_port)) for host, target_port in (item.split(":") for item in next_nodes)],
+             i < sources)
+            for i, (name, port, _, next_nodes, _) in enumerate(generated)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--version", choices=VERSIONS, default="LoRAWAN_Docker")
+    parser.add_argument("--compose", help="docker-compose.yml to take the topology from")
+    parser.add_argument("--nodes", type=int, default=120, help="generate a random topology of this many nodes")
+    parser.add_argument("--neighbors", type=int, default=3, help="NEXT_NODES per node in a generated topology")
+    parser.add_argument("--subnets", type=int, default=1, help="subnet_count of a generated topology (Subnet versions)")
+    parser.add_argument("--sources", type=int, default=1, help="START_NODEs in a generated topology")
+    parser.add_argument("--duration", type=float, default=60, help="virtual seconds to simulate")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between readings of each START_NODE")
+    parser.add_argument("--latency", type=float, default=0.001, help="per-hop delay in seconds, added to any link delay")
+    parser.add_argument("--loss", type=float, default=0.0, help="chance each datagram is lost")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", default="simulation", help="directory for collected_logs/")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    node = load_node(args.version)
+    topology = read_compose(args.compose) if args.compose else random_topology(
+        args.version, args.nodes, args.neighbors, args.subnets, args.sources, random.Random(args.seed))
+
+    started = time.perf_counter()
+    sim = simulate(node, topology, args.duration, args.interval, args.latency, args.loss)
+    wall = time.perf_counter() - started
+    sim.write_events(Path(args.out) / "collected_logs")
+
+    events = sum(len(vnode.events) for vnode in sim.nodes.values())
+    reached = sum(1 for vnode in sim.nodes.values() if vnode.events)
+    print(f"{len(sim.nodes)} nodes, {args.duration:.0f} virtual seconds in {wall:.2f} s wall time")
+    print(f"{sim.datagrams} datagrams ({sim.lost} lost), {events} events, {reached} nodes received something")
+    print(f"Forwarding: {json.dumps(dict(node.FORWARD_STATS, strategy=node.FORWARD_STRATEGY))}")
+    print(f"Events written to {Path(args.out) / 'collected_logs'}; run analyze_mesh.py from {args.out}")
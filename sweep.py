@@ -0,0 +1,357 @@
+"""
+Parameter Sweep
+Runs the mesh once for every point of a parameter grid (num_nodes, max_neighbors,
+subnet_count, ttl, fan-out, loss rate), several experiments at a time on a
+process pool, and writes one CSV row of delivery figures per point.
+
+Every experiment works in its own directory, <cache>/<hash>, named by a hash of
+its configuration. The directory holds the generated docker-compose.yml and
+host_nodes.txt, collected_logs/ and result.json. A point whose result.json is
+already there is not run again, so repeating or extending a sweep only runs the
+new points, and analyze_mesh.py can be run from any of the directories later.
+
+Backends:
+    docker  the generated compose file as its own project (mesh_<hash>), so
+            experiments run side by side; node options go in the environment
+    host    node.py in host mode (HOST_NODES), the whole mesh in one process
+    sim     simulate_mesh.py's discrete-event simulation, in the worker process
+Each pool worker gets its own LISTEN_PORT range, so concurrent host-mode runs
+on the loopback addresses never share a port.
+
+With --record every node's random decisions and sensor readings are written to
+<hash>/decisions.json. A later sweep of the same grid with --replay takes them
+from there again, so a code change can be compared on identical runs (--force
+runs points again even if their result is cached, replacing their recordings
+and logs). Each replayed point is
+compared with its recording; with the sim backend any difference is an error,
+since a simulated replay must reproduce its recording exactly.
+
+Usage:
+    python sweep.py --backend sim --nodes 60,120 --neighbors 2,3,4 --ttl 5,10 --loss 0,0.1 --csv sweep.csv
+    python sweep.py --backend docker --version LoRAWAN_Subnet --subnets 2,4 --fanout 0,2 --duration 60 --workers 2
+    python sweep.py --backend host --nodes 60 --fanout 1,2 --record; python sweep.py --backend host --nodes 60 --fanout 1,2 --replay
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+from benchmark_node import VERSIONS, load_generator
+
+ROOT = Path(__file__).resolve().parent
+CPU_LIMIT = "0.05"  # per container, as in generate_mesh_compose*.py
+MEM_LIMIT = "20m"
+CSV_FIELDS = ["hash", "version", "backend", "num_nodes", "max_neighbors", "subnet_count", "ttl", "fanout", "loss",
+              "duration", "seed", "messages", "deliveries", "coverage", "avg_hops", "max_hops", "avg_spread_s",
+              "datagrams", "datagrams_per_delivery", "wall_s"]
+REPLAY_FIELDS = ["messages", "deliveries", "coverage", "avg_hops", "max_hops", "datagrams"]  # compared with the recording
+
+WORKER_SLOT = None  # this pool worker's port range
+
+
+def config_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def node_env(config):
+    """Node options every node of the experiment runs with."""
+    env = {"MSG_TTL": str(config["ttl"]), "FANOUT": str(config["fanout"]), "LOSS_RATE": str(config["loss"]),
+           "SEED": str(config["seed"])}
+    if config.get("record"):
+        env["RANDOM_RECORD"] = "decisions.json"
+    if config.get("replay"):
+        env["RANDOM_REPLAY"] = "replay.json"  # copied from the recorded point by run_experiment()
+    env.update(config["env"])
+    return env
+
+
+def generate_compose(config, base_port, image):
+    """docker-compose.yml contents for the topology the version's generate_mesh_compose*.py builds.
+
+    Services have no container_name, so compose prefixes them with the project
+    name and several experiments can run at once.
+    """
+    topology = load_generator(config["version"]).mesh_topology(
+        config["num_nodes"], config["max_neighbors"], config["subnet_count"], random.Random(config["seed"]), base_port)
+    services, networks = {}, set()
+    for name, port, node_networks, next_nodes, start_node in topology:
+        networks.update(node_networks)
+        services[name] = {
+            "image": image,
+            "environment": [
+                f"NODE_NAME={name}",
+                f"LISTEN_PORT={port}",
+                f"NEXT_NODES={','.join(next_nodes)}",
+                f"START_NODE={'true' if start_node else 'false'}"
+            ] + [f"{key}={value}" for key, value in sorted(node_env(config).items())],
+            "networks": {network: {"aliases": [name]} for network in sorted(node_networks)},
+            "deploy": {"resources": {"limits": {"cpus": CPU_LIMIT, "memory": MEM_LIMIT}}}
+        }
+        if config.get("replay"):
+            services[name]["volumes"] = ["./replay.json:/app/replay.json:ro"]
+    return {"services": services, "networks": {network: {"driver": "bridge"} for network in sorted(networks)}}
+
+
+def write_topology(config, workdir, base_port, image):
+    compose = generate_compose(config, base_port, image)
+    with open(workdir / "docker-compose.yml", "w") as f:
+        yaml.dump(compose, f, default_flow_style=False)
+    with open(workdir / "host_nodes.txt", "w") as f:
+        for service in compose["services"].values():
+            f.write(" ".join(service["environment"][:4]) + "\n")  # node options come from the process environment
+    return list(compose["services"])
+
+
+def run_docker(config, workdir, names):
+    compose = ["docker", "compose", "-p", f"mesh_{workdir.name}", "-f", str(workdir / "docker-compose.yml")]
+    log_dir = workdir / "collected_logs"
+    log_dir.mkdir(exist_ok=True)
+    try:
+        subprocess.run(compose + ["up", "-d"], check=True, capture_output=True)
+        time.sleep(config["duration"])
+        for name in names:
+            for kind in ("events", "stats", "decisions"):
+                subprocess.run(compose + ["cp", f"{name}:/app/{kind}.json", str(log_dir / f"{name}_{kind}.json")],
+                               capture_output=True)
+    finally:
+        subprocess.run(compose + ["down", "--remove-orphans"], capture_output=True)
+    if config.get("record"):
+        with open(workdir / "decisions.json", "wb") as out:  # one file for the whole mesh, as in host mode
+            for path in sorted(log_dir.glob("*_decisions.json")):
+                out.write(path.read_bytes())
+    return None
+
+
+def run_host(config, workdir):
+    env = dict(os.environ, HOST_NODES="host_nodes.txt", HOST_LOG_DIR="collected_logs", **node_env(config))
+    with open(workdir / "host.log", "w") as log:
+        proc = subprocess.Popen([sys.executable, str(ROOT / config["version"] / "node.py")],
+                                cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            time.sleep(config["duration"])
+        finally:
+            proc.terminate()  # host_shutdown() flushes the event logs and writes the stats files
+            proc.wait(timeout=60)
+    return None
+
+
+def run_sim(config, workdir):
+    from benchmark_node import load_node
+    from simulate_mesh import read_compose, simulate
+
+    env = node_env(config)
+    for key in ("RANDOM_RECORD", "RANDOM_REPLAY"):
+        if key in env:
+            env[key] = str(workdir / env[key])
+    saved = dict(os.environ)
+    os.environ.update(env)  # node.py reads its options at import
+    try:
+        node = load_node(config["version"])
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    random.seed(config["seed"])
+    sim = simulate(node, read_compose(workdir / "docker-compose.yml"), config["duration"])  # LOSS_RATE drops datagrams
+    sim.write_events(workdir / "collected_logs")
+    node.DECISIONS.close()
+    return sim.datagrams
+
+
+def summarize(log_dir, num_nodes):
+    """Delivery figures from collected_logs/, first receipt per (node, message)."""
+    first = {}  # (node, msg_id) -> (timestamp, hop)
+    for path in log_dir.glob("*_events.json"):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line cut off at shutdown
+                key = (entry["node"], entry["msg_id"])
+                if key not in first or entry["timestamp"] < first[key][0]:
+                    first[key] = (entry["timestamp"], entry["hop"])
+    per_message = {}
+    for (_, msg_id), (timestamp, _) in first.items():
+        per_message.setdefault(msg_id, []).append(timestamp)
+    hops = [hop for _, hop in first.values()]
+    messages = len(per_message)
+    return {
+        "messages": messages,
+        "deliveries": len(first),
+        "coverage": round(len(first) / (messages * num_nodes), 4) if messages else 0.0,
+        "avg_hops": round(sum(hops) / len(hops), 3) if hops else 0.0,
+        "max_hops": max(hops, default=0),
+        "avg_spread_s": round(sum(max(ts) - min(ts) for ts in per_message.values()) / messages, 4) if messages else 0.0
+    }
+
+
+def tx_datagrams(log_dir):
+    total = 0
+    for path in log_dir.glob("*_stats.json"):
+        try:
+            total += json.loads(path.read_text())["link"]["tx_datagrams"]
+        except (ValueError, KeyError):
+            pass
+    return total
+
+
+def init_worker(slots):
+    global WORKER_SLOT
+    WORKER_SLOT = slots.get()
+
+
+def run_experiment(config, workdir, port_stride, base_port):
+    """One grid point, in a pool worker. Writes <workdir>/result.json last, so only finished points are cached."""
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    # nodes append to their decision and event logs, so a --force rerun must not find the last run's
+    shutil.rmtree(workdir / "collected_logs", ignore_errors=True)
+    for stale in workdir.glob("decisions.json*"):
+        stale.unlink()
+    started = time.perf_counter()
+    if config.get("replay"):
+        recorded = workdir.parent / config["replay"] / "decisions.json"
+        if not recorded.exists():
+            raise FileNotFoundError(f"{recorded} is missing; run the same sweep with --record first")
+        shutil.copyfile(recorded, workdir / "replay.json")
+    names = write_topology(config, workdir, base_port + (WORKER_SLOT or 0) * port_stride,
+                           f"mesh-sweep-{config['version'].lower()}")
+    if config["backend"] == "docker":
+        datagrams = run_docker(config, workdir, names)
+    elif config["backend"] == "host":
+        datagrams = run_host(config, workdir)
+    else:
+        datagrams = run_sim(config, workdir)
+    log_dir = workdir / "collected_logs"
+    result = dict(config, hash=workdir.name, **summarize(log_dir, len(names)))  # MutliSubnet adds bridge nodes
+    result["datagrams"] = datagrams if datagrams is not None else tx_datagrams(log_dir)
+    result["datagrams_per_delivery"] = round(result["datagrams"] / result["deliveries"], 3) if result["deliveries"] else 0.0
+    result["wall_s"] = round(time.perf_counter() - started, 2)
+    with open(workdir / "result.json", "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def parse_list(text, kind):
+    return [kind(item) for item in text.split(",") if item.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["docker", "host", "sim"], default="sim")
+    parser.add_argument("--version", choices=VERSIONS, default="LoRAWAN_Docker")
+    parser.add_argument("--nodes", default="120", help="comma-separated grid of num_nodes")
+    parser.add_argument("--neighbors", default="3", help="comma-separated grid of max_neighbors")
+    parser.add_argument("--subnets", default="1", help="comma-separated grid of subnet_count (1 = one network)")
+    parser.add_argument("--ttl", default="10", help="comma-separated grid of MSG_TTL")
+    parser.add_argument("--fanout", default="0", help="comma-separated grid of FANOUT (0 = every neighbor)")
+    parser.add_argument("--loss", default="0", help="comma-separated grid of LOSS_RATE")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra node option for every experiment, e.g. FORWARD_STRATEGY=gossip (repeatable)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds each experiment runs (virtual for sim)")
+    parser.add_argument("--seed", type=int, default=0, help="topology seed (and simulation seed for sim)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="experiments run at once")
+    parser.add_argument("--base-port", type=int, default=20000, help="first port of the per-worker port ranges")
+    parser.add_argument("--cache", default="sweeps", help="directory of per-experiment results")
+    parser.add_argument("--force", action="store_true", help="run every point, even if its result is cached")
+    parser.add_argument("--record", action="store_true", help="record random decisions to <hash>/decisions.json")
+    parser.add_argument("--replay", action="store_true", help="replay each point's decisions from its --record run")
+    parser.add_argument("--csv", default="sweep.csv", help="one row per grid point")
+    args = parser.parse_args()
+
+    if args.backend != "sim" and args.version == "LoRAWAN_minikube":
+        parser.error("the minikube version runs under Kubernetes; use --backend sim for it")
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    grid = itertools.product(parse_list(args.nodes, int), parse_list(args.neighbors, int), parse_list(args.subnets, int),
+                             parse_list(args.ttl, int), parse_list(args.fanout, int), parse_list(args.loss, float))
+    configs = [{"version": args.version, "backend": args.backend, "num_nodes": n, "max_neighbors": k, "subnet_count": s,
+                "ttl": ttl, "fanout": fanout, "loss": loss, "duration": args.duration, "seed": args.seed, "env": extra_env}
+               for n, k, s, ttl, fanout, loss in grid]
+    for config in configs:
+        if args.replay:
+            config["replay"] = config_hash(dict(config, record=True))  # the --record run of the same point
+        if args.record:
+            config["record"] = True
+    generator = load_generator(args.version)
+    port_stride = 1  # enough ports for the largest topology, bridge nodes included
+    for num_nodes, subnet_count in {(config["num_nodes"], config["subnet_count"]) for config in configs}:
+        try:
+            topology = generator.mesh_topology(num_nodes, 1, subnet_count, random.Random(0), base_port=0)
+        except ValueError as e:
+            parser.error(f"{args.version}: {e}")
+        port_stride = max(port_stride, max(port for _, port, _, _, _ in topology) + 1)
+    if args.base_port + args.workers * port_stride > 65535:
+        parser.error(f"{args.workers} port ranges of {port_stride} do not fit above --base-port {args.base_port}")
+
+    cache = Path(args.cache)
+    results, pending = {}, {}
+    for config in configs:
+        key = config_hash(config)
+        path = cache / key / "result.json"
+        if path.exists() and not args.force:
+            results[key] = json.loads(path.read_text())
+        else:
+            pending[key] = config
+    print(f"[sweep] {len(configs)} grid points: {len(results)} cached, {len(pending)} to run", flush=True)
+
+    if pending and args.backend == "docker":
+        image = f"mesh-sweep-{args.version.lower()}"
+        print(f"[sweep] Building {image} from {args.version}/", flush=True)
+        subprocess.run(["docker", "build", "-q", "-t", image, str(ROOT / args.version)], check=True)
+
+    if pending:
+        slots = multiprocessing.Queue()
+        for slot in range(args.workers):
+            slots.put(slot)
+        with concurrent.futures.ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(slots,)) as pool:
+            futures = {pool.submit(run_experiment, config, str(cache / key), port_stride, args.base_port): key
+                       for key, config in pending.items()}
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    print(f"[sweep] {done}/{len(pending)} {key} failed: {e}", flush=True)
+                    continue
+                print(f"[sweep] {done}/{len(pending)} {key} coverage={results[key]['coverage']} "
+                      f"avg_hops={results[key]['avg_hops']} in {results[key]['wall_s']} s", flush=True)
+
+    with open(args.csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for config in configs:
+            key = config_hash(config)
+            if key in results:
+                writer.writerow(results[key])
+    print(f"[sweep] {sum(config_hash(c) in results for c in configs)} rows written to {args.csv}", flush=True)
+
+    if args.replay:
+        mismatched = 0
+        for config in configs:
+            key = config_hash(config)
+            recorded_path = cache / config["replay"] / "result.json"
+            if key not in results or not recorded_path.exists():
+                continue
+            recorded = json.loads(recorded_path.read_text())
+            diff = {field: (recorded[field], results[key][field]) for field in REPLAY_FIELDS
+                    if recorded[field] != results[key][field]}
+            if diff:
+                mismatched += 1
+                print(f"[sweep] replay {key} differs from recording {config['replay']}: " +
+                      ", ".join(f"{field} {old} vs {new}" for field, (old, new) in diff.items()), flush=True)
+        print(f"[sweep] {len(results) - mismatched} replays match their recordings, {mismatched} differ", flush=True)
+        if mismatched and args.backend == "sim":
+            sys.exit(1)